@@ -1,7 +1,21 @@
 # CFGReader.py sesso
+import configparser
 import os
+from types import MappingProxyType
+
+# Cache dei file già letti: (percorso assoluto, mtime) → dati parsati (read-only)
+_PARSE_CACHE: dict[tuple[str, float], MappingProxyType] = {}
+
+_TRUE  = frozenset(("true", "1", "on", "yes"))
+_FALSE = frozenset(("false", "0", "off", "no"))
+
+# Nome di sezione di default di configparser: mai presente nei file, così
+# [DEFAULT] resta una sezione normale invece di finire in tutte le altre
+_NO_DEFAULT = "\0cfgreader-no-default\0"
 
 class CFGReader:
+    __slots__ = ('data', 'loaded')
+
     def __init__(self, file_name: str):
         self.data = {}
         self.loaded = False
@@ -9,42 +23,102 @@ class CFGReader:
         if not os.path.exists(file_name):
             return
 
-        with open(file_name, 'r', encoding='utf-8') as file:
+        cache_key = (os.path.abspath(file_name), os.path.getmtime(file_name))
+        cached = _PARSE_CACHE.get(cache_key)
+        if cached is not None:
+            self.data = cached
             self.loaded = True
-            current_section = None
-            for line in file:
-                line = self._remove_inline_comments(line).strip()
-                if not line:
-                    continue
+            return
+
+        # Lettura in blocco: il file è piccolo, un solo read + split in C
+        with open(file_name, 'rb') as file:
+            raw = file.read()
 
-                # Section header
-                if line.startswith('[') and ']' in line:
-                    current_section = line[1:line.find(']')].strip().lower()
-                    if current_section not in self.data:
-                        self.data[current_section] = {}
+        # configparser non conosce i commenti '//': le righe vengono ripulite
+        # prima (commenti + spazi) e le chiavi fuori da ogni sezione scartate.
+        # Le intestazioni sono riscritte come nel parser originale: nome fino
+        # alla prima ']', senza spazi e in minuscolo ("[ Servo ]" → "[servo]");
+        # le chiavi di una sezione senza nome ("[]") vengono scartate.
+        lines = []
+        in_section = False
+        for line in raw.decode('utf-8').split('\n'):
+            line = self._remove_inline_comments(line).strip()
+            if not line:
+                continue
+            if line[:1] == '[':
+                head, sep, _ = line[1:].partition(']')
+                if sep:
+                    head = head.strip().lower()
+                    self.data.setdefault(head, {})
+                    in_section = bool(head)
+                    if in_section:
+                        lines.append(f"[{head}]")
                     continue
+            if in_section:
+                lines.append(line)
+
+        cp = configparser.ConfigParser(
+            delimiters=('=',),
+            comment_prefixes=(),
+            strict=False,           # sezioni ripetute (es. [servo]) vengono unite
+            allow_no_value=True,    # righe senza '=' ignorate come prima
+            interpolation=None,
+            default_section=_NO_DEFAULT,
+        )
+        cp.read_string('\n'.join(lines), source=file_name)
 
-                # key=value
-                if '=' in line and current_section:
-                    key, value = line.split('=', 1)
-                    self.data[current_section][key.strip().lower()] = value.strip()
+        self.loaded = True
+        for section in cp.sections():
+            values = self.data.setdefault(section, {})
+            for key, value in cp.items(section, raw=True):
+                if value is not None:
+                    values[key] = self._coerce(value)
+
+        # Congela i dati: sono condivisi tra tutte le istanze che leggono lo stesso file
+        self.data = MappingProxyType({
+            sec: MappingProxyType(vals) for sec, vals in self.data.items()
+        })
+        _PARSE_CACHE[cache_key] = self.data
+
+    @staticmethod
+    def invalidate(file_name: str = None):
+        """Svuota la cache per un file (o per tutti se file_name è None)."""
+        if file_name is None:
+            _PARSE_CACHE.clear()
+            return
+        path = os.path.abspath(file_name)
+        for k in [k for k in _PARSE_CACHE if k[0] == path]:
+            del _PARSE_CACHE[k]
 
     def _remove_inline_comments(self, s: str) -> str:
-        for marker in [';', '#', '//']:
+        """
+        Taglia la riga al primo marker di commento valido (';', '#', '//').
+        '//' conta solo a inizio riga o se preceduto da uno spazio
+        (così 'http://...' resta intatto).
+        """
+        best = len(s)
+        for marker in (';', '#'):
             pos = s.find(marker)
-            if pos != -1:
-                if marker == '//' and not (pos == 0 or s[pos-1].isspace()):
-                    continue
-                s = s[:pos]
-        return s
+            if 0 <= pos < best:
+                best = pos
 
-    def read(self, section: str, key: str):
-        val = self.data[section.lower()][key.lower()]
+        pos = s.find('//')
+        while 0 <= pos < best:
+            if pos == 0 or s[pos-1].isspace():
+                best = pos
+                break
+            pos = s.find('//', pos + 2)
+
+        return s[:best] if best < len(s) else s
+
+    @staticmethod
+    def _coerce(val: str):
+        """Converte il valore grezzo nel tipo Python nativo (bool, int, float, str)."""
         val_l = val.lower()
 
         # Booleans
-        if val_l in ("true", "1", "on", "yes"): return True
-        if val_l in ("false", "0", "off", "no"): return False
+        if val_l in _TRUE: return True
+        if val_l in _FALSE: return False
 
         # Numbers
         try:
@@ -54,5 +128,17 @@ class CFGReader:
         except ValueError:
             return val  # fallback string
 
+    def read(self, section: str, key: str):
+        # Sezioni e chiavi sono salvate in minuscolo: i chiamanti usano già
+        # letterali minuscoli, quindi si prova prima la lookup diretta.
+        try:
+            return self.data[section][key]
+        except KeyError:
+            return self.get(section, key)
+
+    def get(self, section: str, key: str):
+        """Come read(), ma normalizza sempre sezione e chiave in minuscolo."""
+        return self.data[section.lower()][key.lower()]
+
     def __bool__(self):
         return self.loaded
\ No newline at end of file
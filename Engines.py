@@ -24,6 +24,10 @@ import time
 from CFGReader import CFGReader
 
 
+def _clamp(value: float, lo: float = -100.0, hi: float = 100.0) -> float:
+    return max(lo, min(hi, value))
+
+
 class Engines:
     """
     Controlla 4 motori DC (2x driver TB6612) + 1 servo.
@@ -35,20 +39,102 @@ class Engines:
            0 = stop
     """
 
+    # Niente __dict__ per istanza: meno memoria e accesso agli attributi più
+    # rapido nel percorso motori. Ogni nuovo attributo va aggiunto qui.
+    __slots__ = (
+        "_cfg", "_channels", "_wheel", "_wheel_fast",
+        "_all_wheels", "_drive", "_left_inv", "_right_inv",
+        "_macro_levels", "_last_state", "_deadline", "_on_deadline",
+        "_gpio", "_pwm_started", "_servo_started",
+        "base_speed", "max_speed", "min_speed", "turn_speed",
+        "min_turn_speed", "curve_speed", "search_turn_speed",
+        "right_angle_turn_speed", "right_angle_turn_time", "search_time",
+        "servo_settle_time", "maneuver_pause",
+        "_servo_pin", "_servo_freq", "_servo_min", "_servo_center",
+        "_servo_max", "_servo_angle", "_servo_duty_table", "_servo_pwm",
+        "_pwm_freq",
+    )
+
     FRONT_LEFT  = "front_left"
     FRONT_RIGHT = "front_right"
     REAR_LEFT   = "rear_left"
     REAR_RIGHT  = "rear_right"
 
-    def __init__(self, config_file: str = "motors.cfg"):
+    # Parametri letti da motors.cfg: (attributo, sezione, chiave)
+    _PARAM_SPEC = (
+        # ── Velocità ──────────────────────────────────────────────────────────
+        ("base_speed",             "speeds", "base_speed"),
+        ("max_speed",              "speeds", "max_speed"),
+        ("min_speed",              "speeds", "min_speed"),
+        ("turn_speed",             "speeds", "turn_speed"),
+        ("min_turn_speed",         "speeds", "min_turn_speed"),
+        ("curve_speed",            "speeds", "curve_speed"),
+        ("search_turn_speed",      "speeds", "search_turn_speed"),
+        ("right_angle_turn_speed", "speeds", "right_angle_turn_speed"),
+        # ── Tempi ─────────────────────────────────────────────────────────────
+        ("right_angle_turn_time",  "times",  "right_angle_turn_time"),
+        ("search_time",            "times",  "search_time"),
+        ("servo_settle_time",      "times",  "servo_settle_time"),
+        ("maneuver_pause",         "times",  "maneuver_pause"),
+        # ── Servo ─────────────────────────────────────────────────────────────
+        ("_servo_pin",             "servo",  "pin"),
+        ("_servo_freq",            "servo",  "freq"),
+        ("_servo_min",             "servo",  "angle_min"),
+        ("_servo_center",          "servo",  "angle_center"),
+        ("_servo_max",             "servo",  "angle_max"),
+        # ── PWM ───────────────────────────────────────────────────────────────
+        ("_pwm_freq",              "pwm",    "frequency"),
+    )
+
+    # Riferimenti GPIO pre-risolti: nei metodi caldi evitano la lookup
+    # dell'attributo sul modulo GPIO ad ogni chiamata
+    _HI  = GPIO.HIGH
+    _LO  = GPIO.LOW
+    _OUT = staticmethod(GPIO.output)
+
+    # Segno della velocità → livelli (in1, in2)
+    _DIR = {
+         1: (_HI, _LO),
+        -1: (_LO, _HI),
+         0: (_LO, _LO),
+    }
+
+    def __init__(self, config_file: str = "motors.cfg", gpio: bool = True):
+        """
+        gpio: se False non tocca il GPIO (solo lettura config, es. print_config);
+              i metodi di movimento e servo non sono disponibili.
+        """
         self._cfg = CFGReader(config_file)
         if not self._cfg:
             raise FileNotFoundError(f"File di configurazione '{config_file}' non trovato!")
 
-        GPIO.setmode(GPIO.BCM)
+        # Movimento non bloccante in corso (vedi forward_for / tick)
+        self._deadline:    float | None = None
+        self._on_deadline = None
+
+        # I PWM vengono avviati al primo comando, non all'init
+        self._gpio           = gpio
+        self._pwm_started    = False
+        self._servo_started  = False
+
         self._setup_channels()
         self._load_params()
-        self._setup_gpio()
+        if gpio:
+            GPIO.setmode(GPIO.BCM)
+            self._setup_gpio()
+
+    # Attributi creati solo da _setup_gpio (gpio=True)
+    _GPIO_ONLY = frozenset((
+        "_wheel_fast", "_all_wheels", "_drive", "_left_inv", "_right_inv",
+        "_macro_levels", "_last_state", "_servo_pwm",
+    ))
+
+    def __getattr__(self, name):
+        # Chiamato solo per gli attributi non impostati: nessun costo nel
+        # percorso motori, errore chiaro se si muove un Engines senza GPIO
+        if name in Engines._GPIO_ONLY:
+            raise RuntimeError("Engines creato con gpio=False: movimento e servo non disponibili")
+        raise AttributeError(f"'Engines' object has no attribute '{name}'")
 
     # ══════════════════════════════════════════════════════════════════════════
     #  Setup interno
@@ -89,77 +175,160 @@ class Engines:
 
     def _load_params(self):
         """Carica velocità, tempi e parametri servo dal config."""
-        cfg = self._cfg
-
-        # ── Velocità ──────────────────────────────────────────────────────────
-        self.base_speed           = cfg.read("speeds", "base_speed")
-        self.max_speed            = cfg.read("speeds", "max_speed")
-        self.min_speed            = cfg.read("speeds", "min_speed")
-        self.turn_speed           = cfg.read("speeds", "turn_speed")
-        self.min_turn_speed       = cfg.read("speeds", "min_turn_speed")
-        self.curve_speed          = cfg.read("speeds", "curve_speed")
-        self.search_turn_speed    = cfg.read("speeds", "search_turn_speed")
-        self.right_angle_turn_speed = cfg.read("speeds", "right_angle_turn_speed")
+        data = self._cfg.data
+        for attr, section, key in self._PARAM_SPEC:
+            setattr(self, attr, data[section][key])
 
-        # ── Tempi ─────────────────────────────────────────────────────────────
-        self.right_angle_turn_time = cfg.read("times", "right_angle_turn_time")
-        self.search_time           = cfg.read("times", "search_time")
-        self.servo_settle_time     = cfg.read("times", "servo_settle_time")
-        self.maneuver_pause        = cfg.read("times", "maneuver_pause")
-
-        # ── Servo ─────────────────────────────────────────────────────────────
-        self._servo_pin    = cfg.read("servo", "pin")
-        self._servo_freq   = cfg.read("servo", "freq")
-        self._servo_min    = cfg.read("servo", "angle_min")
-        self._servo_center = cfg.read("servo", "angle_center")
-        self._servo_max    = cfg.read("servo", "angle_max")
-        self._servo_angle  = self._servo_center
-
-        # ── PWM ───────────────────────────────────────────────────────────────
-        self._pwm_freq = cfg.read("pwm", "frequency")
+        self._servo_angle = self._servo_center
+        # Duty per ogni grado intero 0..180 (gli angoli preimpostati sono interi)
+        self._servo_duty_table = tuple(2.0 + a / 18.0 for a in range(181))
 
     def _setup_gpio(self):
-        """Inizializza tutti i pin GPIO e avvia i PWM."""
+        """Inizializza tutti i pin GPIO e crea i PWM (avviati al primo uso)."""
+        setup, output, out, lo = GPIO.setup, self._OUT, GPIO.OUT, self._LO
         for ch in self._channels.values():
-            GPIO.setup(ch["in1"],     GPIO.OUT)
-            GPIO.setup(ch["in2"],     GPIO.OUT)
-            GPIO.setup(ch["pwm_pin"], GPIO.OUT)
-            GPIO.output(ch["in1"],    GPIO.LOW)
-            GPIO.output(ch["in2"],    GPIO.LOW)
+            setup(ch["in1"],     out)
+            setup(ch["in2"],     out)
+            setup(ch["pwm_pin"], out)
+            output(ch["in1"],    lo)
+            output(ch["in2"],    lo)
             ch["pwm"] = GPIO.PWM(ch["pwm_pin"], self._pwm_freq)
-            ch["pwm"].start(0)
 
         GPIO.setup(self._servo_pin, GPIO.OUT)
         self._servo_pwm = GPIO.PWM(self._servo_pin, self._servo_freq)
-        self._servo_pwm.start(0)
+
+        # Handle pre-risolti per ruota: (in1, in2, ChangeDutyCycle, inversione)
+        # → i gruppi di _side non fanno lookup annidati nei dict dei canali
+        self._wheel_fast: dict[str, tuple] = {
+            pos: (ch["in1"], ch["in2"], ch["pwm"].ChangeDutyCycle, inv)
+            for pos, (ch, inv) in self._wheel.items()
+        }
+
+        # Gruppi di ruote: (posizioni, [in1, in2, ...], (ChangeDutyCycle, ...), (inv, ...))
+        # Ordine fisso FL, FR, RL, RR per le scritture batch di set_motors:
+        # un'unica GPIO.output(lista_pin, lista_livelli) invece di 8 chiamate
+        self._all_wheels = self._side(
+            (self.FRONT_LEFT, self.FRONT_RIGHT, self.REAR_LEFT, self.REAR_RIGHT)
+        )
+        # Lati per il differential drive
+        # (FL, RL | FR, RR): entrambi i lati scritti con un solo _commit
+        self._drive     = self._side((self.FRONT_LEFT, self.REAR_LEFT,
+                                      self.FRONT_RIGHT, self.REAR_RIGHT))
+        self._left_inv  = self._drive[3][:2]
+        self._right_inv = self._drive[3][2:]
+
+        # Movimenti a verso fisso: livelli in1/in2 delle 4 ruote già calcolati
+        # (inversioni incluse), così forward/backward/turn/stop non rifanno
+        # clamp e segno per ogni ruota. Segni in ordine FL, FR, RL, RR.
+        patterns = {
+            "forward":    ( 1,  1,  1,  1),
+            "backward":   (-1, -1, -1, -1),
+            "turn_left":  (-1,  1, -1,  1),
+            "turn_right": ( 1, -1,  1, -1),
+            "stop":       ( 0,  0,  0,  0),
+        }
+        self._macro_levels: dict[str, list] = {}
+        for name, signs in patterns.items():
+            levels = []
+            for sign, inversion in zip(signs, self._all_wheels[3]):
+                levels += self._DIR[sign * inversion]
+            self._macro_levels[name] = levels
+        # Freno attivo: in1 = in2 = HIGH su tutte le ruote
+        self._macro_levels["brake"] = [self._HI] * 8
+
+        # Ultimo stato scritto per ruota: (in1, in2, duty). Serve a saltare le
+        # scritture GPIO/PWM quando il comando non cambia (es. rettilineo).
+        self._last_state: dict[str, tuple[int, int, float]] = {}
+        self.invalidate_cache()
+
+    def _side(self, positions: tuple) -> tuple:
+        """Raggruppa pin in1/in2, ChangeDutyCycle e inversioni delle ruote date."""
+        pins = []
+        for pos in positions:
+            in1, in2, _, _ = self._wheel_fast[pos]
+            pins += (in1, in2)
+        duties     = tuple(self._wheel_fast[pos][2] for pos in positions)
+        inversions = tuple(self._wheel_fast[pos][3] for pos in positions)
+        return positions, pins, duties, inversions
 
     # ══════════════════════════════════════════════════════════════════════════
     #  Metodi interni motori
     # ══════════════════════════════════════════════════════════════════════════
 
-    @staticmethod
-    def _clamp(value: float, lo: float = -100.0, hi: float = 100.0) -> float:
-        return max(lo, min(hi, value))
+    # Variazioni di duty più piccole di così non riprogrammano il PWM
+    _DUTY_EPS = 0.5
 
-    def _set_wheel(self, position: str, speed: float):
+    def _commit(self, group: tuple, levels: list, values: tuple):
         """
-        Imposta la velocità di una singola ruota applicando l'inversione.
-        speed: -100..+100
+        Scrive livelli di direzione e duty di un gruppo di ruote, saltando
+        ciò che non è cambiato rispetto all'ultimo stato scritto.
+        levels: [in1, in2] per ogni ruota del gruppo
+        values: duty (0..100) per ogni ruota del gruppo
         """
-        ch, inversion = self._wheel[position]
-        speed = self._clamp(speed * inversion)
+        if not self._pwm_started:
+            self._start_pwm()
+
+        positions, pins, duties, _ = group
+        last = self._last_state
+        dir_changed = False
+        pending = []
+        for i, pos in enumerate(positions):
+            lvl1, lvl2 = levels[2*i], levels[2*i+1]
+            old1, old2, old_duty = last[pos]
+            if lvl1 != old1 or lvl2 != old2:
+                dir_changed = True
+            duty = values[i]
+            if abs(duty - old_duty) < self._DUTY_EPS and (duty == 0) == (old_duty == 0):
+                duty = old_duty
+            else:
+                pending.append((duties[i], duty))
+            last[pos] = (lvl1, lvl2, duty)
+
+        if dir_changed:
+            self._OUT(pins, levels)
+        for change_duty, duty in pending:
+            change_duty(duty)
+
+    def _start_pwm(self):
+        """Avvia i PWM dei 4 motori (duty 0). Chiamato dal primo _commit."""
+        for ch in self._channels.values():
+            ch["pwm"].start(0)
+        self._pwm_started = True
 
-        if speed > 0:
-            GPIO.output(ch["in1"], GPIO.HIGH)
-            GPIO.output(ch["in2"], GPIO.LOW)
-        elif speed < 0:
-            GPIO.output(ch["in1"], GPIO.LOW)
-            GPIO.output(ch["in2"], GPIO.HIGH)
-        else:
-            GPIO.output(ch["in1"], GPIO.LOW)
-            GPIO.output(ch["in2"], GPIO.LOW)
+    def _side_cmd(self, speed: float, inversions: tuple) -> tuple[list, float]:
+        """
+        Livelli in1/in2 e duty per le ruote di un lato con la stessa velocità.
+        Clamp, segno e duty vengono calcolati una volta sola; l'inversione
+        (±1) di ogni ruota cambia solo il verso.
+        """
+        if speed > 100.0:
+            speed = 100.0
+        elif speed < -100.0:
+            speed = -100.0
+        sign = (speed > 0) - (speed < 0)
+
+        direction = self._DIR
+        levels = []
+        for inversion in inversions:
+            levels += direction[sign * inversion]
+        return levels, abs(speed)
+
+    def _macro(self, name: str, speed: float):
+        """
+        Esegue un movimento a verso fisso con tutte le ruote a duty = speed.
+        speed: 0..100 (già clampata dal chiamante)
+        """
+        if speed == 0:
+            name = "stop"
+        self._commit(self._all_wheels, self._macro_levels[name], (speed,) * 4)
 
-        ch["pwm"].ChangeDutyCycle(abs(speed))
+    def invalidate_cache(self):
+        """
+        Dimentica l'ultimo stato scritto: il prossimo comando riscrive
+        tutti i pin e i duty, anche se uguali a quelli precedenti.
+        """
+        for pos in self._wheel_fast:
+            self._last_state[pos] = (-1, -1, -1.0)
 
     # ══════════════════════════════════════════════════════════════════════════
     #  API pubblica — controllo diretto
@@ -171,17 +340,31 @@ class Engines:
         fl=front_left, fr=front_right, rl=rear_left, rr=rear_right
         Valori: -100..+100
         """
-        self._set_wheel(self.FRONT_LEFT,  fl)
-        self._set_wheel(self.FRONT_RIGHT, fr)
-        self._set_wheel(self.REAR_LEFT,   rl)
-        self._set_wheel(self.REAR_RIGHT,  rr)
+        group = self._all_wheels
+        direction = self._DIR
+        levels = []
+        duties = []
+        for speed, inversion in zip((fl, fr, rl, rr), group[3]):
+            speed *= inversion
+            if speed > 100.0:
+                speed = 100.0
+            elif speed < -100.0:
+                speed = -100.0
+            levels += direction[(speed > 0) - (speed < 0)]
+            duties.append(abs(speed))
+
+        # Tutti gli 8 pin di direzione in una sola chiamata
+        self._commit(group, levels, duties)
 
     def set_speed(self, left: float, right: float):
         """
         Imposta la velocità del lato sinistro e destro (differential drive).
         Comodo per il PID: set_speed(base + correction, base - correction)
         """
-        self.set_motors(left, right, left, right)
+        left_levels,  left_duty  = self._side_cmd(left,  self._left_inv)
+        right_levels, right_duty = self._side_cmd(right, self._right_inv)
+        self._commit(self._drive, left_levels + right_levels,
+                     (left_duty, left_duty, right_duty, right_duty))
 
     # ══════════════════════════════════════════════════════════════════════════
     #  API pubblica — movimenti base (usano velocità dal config)
@@ -193,11 +376,9 @@ class Engines:
         speed:    velocità (default: base_speed dal config)
         duration: se specificato, si muove per N secondi poi si ferma
         """
-        speed = self._clamp(speed if speed is not None else self.base_speed, 0, 100)
-        self.set_motors(speed, speed, speed, speed)
+        self.forward_for(speed, duration)
         if duration is not None:
-            time.sleep(duration)
-            self.stop()
+            self._wait_deadline()
 
     def backward(self, speed: float = None, duration: float = None):
         """
@@ -205,26 +386,22 @@ class Engines:
         speed:    velocità (default: base_speed dal config)
         duration: se specificato, si muove per N secondi poi si ferma
         """
-        speed = self._clamp(speed if speed is not None else self.base_speed, 0, 100)
-        self.set_motors(-speed, -speed, -speed, -speed)
+        self.backward_for(speed, duration)
         if duration is not None:
-            time.sleep(duration)
-            self.stop()
+            self._wait_deadline()
 
     def stop(self):
         """Ferma tutti i motori (coast — ruote libere)."""
-        self.set_motors(0, 0, 0, 0)
+        self._deadline    = None
+        self._on_deadline = None
+        self._macro("stop", 0)
 
     def brake(self, duration: float = None):
         """
         Freno attivo: blocca le ruote elettricamente.
         duration: se specificato, frena per N secondi poi rilascia
         """
-        for position in self._wheel:
-            ch, _ = self._wheel[position]
-            GPIO.output(ch["in1"], GPIO.HIGH)
-            GPIO.output(ch["in2"], GPIO.HIGH)
-            ch["pwm"].ChangeDutyCycle(100)
+        self._commit(self._all_wheels, self._macro_levels["brake"], (100,) * 4)
         if duration is not None:
             time.sleep(duration)
             self.stop()
@@ -236,11 +413,9 @@ class Engines:
         duration: se specificato, gira per N secondi poi si ferma
                   (default: right_angle_turn_time dal config)
         """
-        speed = self._clamp(speed if speed is not None else self.turn_speed, 0, 100)
-        self.set_motors(-speed, speed, -speed, speed)
+        self.turn_left_for(speed, duration)
         if duration is not None:
-            time.sleep(duration)
-            self.stop()
+            self._wait_deadline()
 
     def turn_right(self, speed: float = None, duration: float = None):
         """
@@ -248,11 +423,68 @@ class Engines:
         speed:    velocità (default: turn_speed dal config)
         duration: se specificato, gira per N secondi poi si ferma
         """
-        speed = self._clamp(speed if speed is not None else self.turn_speed, 0, 100)
-        self.set_motors(speed, -speed, speed, -speed)
+        self.turn_right_for(speed, duration)
         if duration is not None:
-            time.sleep(duration)
-            self.stop()
+            self._wait_deadline()
+
+    # ══════════════════════════════════════════════════════════════════════════
+    #  API pubblica — movimenti non bloccanti
+    # ══════════════════════════════════════════════════════════════════════════
+    #
+    #  Le varianti *_for avviano il movimento e registrano una scadenza invece
+    #  di dormire: il loop del chiamante deve invocare tick() periodicamente,
+    #  che ferma i motori quando la scadenza è passata.
+    #  Un nuovo movimento (forward/backward/turn/stop) sostituisce la scadenza
+    #  in corso; set_speed/set_motors/curve non la toccano.
+
+    def forward_for(self, speed: float = None, duration: float = None):
+        """Avanti per duration secondi senza bloccare (vedi tick())."""
+        speed = speed if speed is not None else self.base_speed
+        self._move("forward", speed, duration)
+
+    def backward_for(self, speed: float = None, duration: float = None):
+        """Indietro per duration secondi senza bloccare (vedi tick())."""
+        speed = speed if speed is not None else self.base_speed
+        self._move("backward", speed, duration)
+
+    def turn_left_for(self, speed: float = None, duration: float = None):
+        """Rotazione a sinistra per duration secondi senza bloccare (vedi tick())."""
+        speed = speed if speed is not None else self.turn_speed
+        self._move("turn_left", speed, duration)
+
+    def turn_right_for(self, speed: float = None, duration: float = None):
+        """Rotazione a destra per duration secondi senza bloccare (vedi tick())."""
+        speed = speed if speed is not None else self.turn_speed
+        self._move("turn_right", speed, duration)
+
+    def tick(self) -> bool:
+        """
+        Da chiamare nel loop principale: esegue l'azione di fine movimento
+        (stop) se la scadenza è passata.
+        return: True se l'azione è stata eseguita in questa chiamata
+        """
+        if self._deadline is None or time.monotonic() < self._deadline:
+            return False
+        action = self._on_deadline
+        self._deadline    = None
+        self._on_deadline = None
+        action()
+        return True
+
+    def _move(self, name: str, speed: float, duration: float = None):
+        self._macro(name, _clamp(speed, 0, 100))
+        if duration is not None:
+            self._deadline    = time.monotonic() + duration
+            self._on_deadline = self.stop
+        else:
+            self._deadline    = None
+            self._on_deadline = None
+
+    def _wait_deadline(self):
+        """Attende (bloccando) la scadenza corrente ed esegue l'azione finale."""
+        if self._deadline is not None:
+            time.sleep(max(0.0, self._deadline - time.monotonic()))
+            self.tick()
 
     # ══════════════════════════════════════════════════════════════════════════
     #  API pubblica — manovre avanzate
@@ -270,12 +502,29 @@ class Engines:
         La ruota esterna accelera, quella interna rallenta/inverte.
         La velocità di ogni lato viene tenuta entro [min_turn_speed, max_speed].
         """
-        speed    = speed if speed is not None else self.base_speed
-        speed    = self._clamp(speed)
-        steering = self._clamp(steering)
-
-        left_speed  = self._clamp(speed + steering, self.min_turn_speed, self.max_speed)
-        right_speed = self._clamp(speed - steering, self.min_turn_speed, self.max_speed)
+        speed = speed if speed is not None else self.base_speed
+
+        # Clamp inline: curve() gira ad ogni tick del PID, niente chiamate extra
+        if speed > 100.0:
+            speed = 100.0
+        elif speed < -100.0:
+            speed = -100.0
+        if steering > 100.0:
+            steering = 100.0
+        elif steering < -100.0:
+            steering = -100.0
+
+        lo, hi = self.min_turn_speed, self.max_speed
+        left_speed = speed + steering
+        if left_speed > hi:
+            left_speed = hi
+        if left_speed < lo:
+            left_speed = lo
+        right_speed = speed - steering
+        if right_speed > hi:
+            right_speed = hi
+        if right_speed < lo:
+            right_speed = lo
 
         self.set_speed(left_speed, right_speed)
 
@@ -332,9 +581,16 @@ class Engines:
         settle_time: attesa dopo il movimento (default: servo_settle_time dal config)
         """
         settle_time = settle_time if settle_time is not None else self.servo_settle_time
-        angle = self._clamp(angle, self._servo_min, self._servo_max)
-        duty  = 2.0 + (angle / 18.0)
-        self._servo_pwm.ChangeDutyCycle(duty)
+        angle = _clamp(angle, self._servo_min, self._servo_max)
+        if angle == int(angle) and 0 <= angle <= 180:
+            duty = self._servo_duty_table[int(angle)]
+        else:
+            duty = 2.0 + (angle / 18.0)
+        if self._servo_started:
+            self._servo_pwm.ChangeDutyCycle(duty)
+        else:
+            self._servo_pwm.start(duty)
+            self._servo_started = True
         self._servo_angle = angle
         if settle_time > 0:
             time.sleep(settle_time)
@@ -392,10 +648,19 @@ class Engines:
 
     def cleanup(self):
         """Ferma tutto e libera il GPIO. Da chiamare sempre alla fine."""
-        self.stop()
-        self._servo_pwm.stop()
-        for ch in self._channels.values():
-            ch["pwm"].stop()
+        if not self._gpio:
+            return
+        # PWM mai avviati (robot mai mosso): niente stop() → _commit(), che
+        # li avvierebbe solo per fermarli pilotando per un attimo gli enable
+        if self._pwm_started:
+            self.stop()
+            for ch in self._channels.values():
+                ch["pwm"].stop()
+        else:
+            self._deadline    = None
+            self._on_deadline = None
+        if self._servo_started:
+            self._servo_pwm.stop()
         GPIO.cleanup()
 
     def __enter__(self):
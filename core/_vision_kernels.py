@@ -0,0 +1,74 @@
+"""
+core/_vision_kernels.py
+-----------------------
+Kernel Numba per la pipeline di visione del LineDetector.
+
+threshold_mask() fonde in un solo passaggio per riga:
+  box blur k x k (k = 1, 3, 5) → soglia invertita → azzeramento margini laterali
+invece dei tre passaggi separati boxFilter → threshold → maschera.
+Il risultato è lo stesso della pipeline OpenCV (boxFilter con bordo
+replicato e arrotondamento, poi THRESH_BINARY_INV); con kernel più grandi
+OpenCV usa GaussianBlur e il LineDetector non chiama il kernel Numba.
+
+Niente parallel=True: su una ROI di poche decine di righe l'avvio del
+pool di thread Numba costa più del lavoro, e il pool occuperebbe anche il
+core riservato al controllo.
+
+Numba è opzionale: se non è installato HAVE_NUMBA è False e il
+LineDetector usa la pipeline OpenCV.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+
+if HAVE_NUMBA:
+
+    @njit(cache=True, fastmath=True)
+    def threshold_mask(gray, thr, margin, k, out):
+        """
+        gray:   ROI in scala di grigi (uint8, h x w)
+        thr:    soglia: pixel (dopo il blur) più scuri o uguali → 255 (linea), altrimenti 0
+        margin: colonne da azzerare a sinistra e a destra
+        k:      lato del box blur, dispari (1 = nessun blur)
+        out:    buffer uint8 h x w già allocato (scritto in place, diverso da gray)
+        """
+        h, w = gray.shape
+        lo = min(margin, w)
+        hi = max(w - margin, lo)
+        r = k // 2
+        # round(s / k²) <= thr  ⇔  2s < (2thr + 1)·k²: confronto intero
+        # sulla somma, senza divisione né arrotondamento per pixel
+        lim = np.uint32((2 * thr + 1) * k * k)
+        col = np.empty(w, np.uint32)
+        for i in range(h):
+            dst = out[i]
+            for j in range(lo):
+                dst[j] = 0
+            for j in range(hi, w):
+                dst[j] = 0
+            if k == 1:
+                row = gray[i]
+                for j in range(lo, hi):
+                    dst[j] = 0 if row[j] > thr else 255
+                continue
+            # Somme verticali su k righe (bordo replicato), poi finestra orizzontale
+            for j in range(w):
+                col[j] = 0
+            for di in range(-r, r + 1):
+                row = gray[min(max(i + di, 0), h - 1)]
+                for j in range(w):
+                    col[j] += row[j]
+            for j in range(lo, hi):
+                s = np.uint32(0)
+                for dj in range(-r, r + 1):
+                    s += col[min(max(j + dj, 0), w - 1)]
+                dst[j] = 255 if 2 * s < lim else 0
+
+else:
+    threshold_mask = None
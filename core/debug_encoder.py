@@ -0,0 +1,153 @@
+"""
+core/debug_encoder.py
+---------------------
+Thread dedicato all'encode JPEG del frame di debug per lo stream web.
+
+Il loop di visione pubblica solo i dati grezzi del frame (publish_raw) in
+uno slot singolo: se l'encoder è ancora occupato, il frame in attesa viene
+sostituito dal più recente (drop-old). Il thread, confinato sul core di
+servizio e in SCHED_IDLE, disegna le annotazioni tramite la callback
+render e codifica il JPEG; i client MJPEG attendono il risultato con
+wait_jpeg().
+
+L'encode avviene solo se c'è almeno un client collegato: i generatori
+MJPEG si registrano con add_client() / remove_client(). Ogni client ha un
+proprio threading.Event, impostato a ogni JPEG pubblicato: il risveglio
+non passa da un lock condiviso che N client dovrebbero riacquisire uno
+dopo l'altro.
+"""
+
+import threading
+from collections import deque
+import cv2
+from utils.logger import get_logger
+from utils.rt import pin_cpus, set_idle
+
+log = get_logger("DebugEncoder")
+
+
+class DebugEncoder:
+    """
+    Encoder JPEG asincrono con slot singoli in ingresso e in uscita.
+
+    render:  callback (dati grezzi) → immagine BGR annotata, chiamata nel
+             thread dell'encoder
+    cpu:     core su cui confinare il thread (core di servizio)
+    quality: qualità JPEG (60: file piccoli, sufficiente per il debug)
+    """
+
+    def __init__(self, render, cpu: int = 0, quality: int = 60):
+        self._render = render
+        self._cpu    = cpu
+        # OPTIMIZE=0: niente secondo passaggio per le tabelle Huffman ottimali
+        self._params = [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_OPTIMIZE, 0]
+
+        # Ingresso: ultimo frame grezzo da codificare
+        self._raw    = deque(maxlen=1)
+        self._raw_cv = threading.Condition()
+
+        # Uscita: (numero di sequenza, ultimo JPEG), sostituita in blocco a
+        # ogni pubblicazione; i client saltano i duplicati tramite seq
+        self._latest   = (0, None)
+        self._pub_lock = threading.Lock()
+
+        # Un Event per client; tupla ricreata a ogni add/remove, così
+        # publish_jpeg() la scorre senza lock
+        self._events       = ()
+        self._clients_lock = threading.Lock()
+
+        self._running = False
+        self._thread  = None
+
+    # ── Lifecycle ─────────────────────────────────────────────────────────────
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name="DebugEncoder")
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        with self._raw_cv:
+            self._raw_cv.notify_all()
+        if self._thread:
+            self._thread.join(timeout=2)
+
+    # ── Client ────────────────────────────────────────────────────────────────
+
+    def add_client(self) -> threading.Event:
+        """
+        Registra un client dello stream (abilita l'encode).
+        Restituisce l'Event del client, da passare a wait_jpeg() e remove_client().
+        """
+        event = threading.Event()
+        with self._clients_lock:
+            self._events += (event,)
+        return event
+
+    def remove_client(self, event: threading.Event):
+        """Rimuove un client dello stream (senza client l'encode si ferma)."""
+        with self._clients_lock:
+            self._events = tuple(e for e in self._events if e is not event)
+
+    @property
+    def active(self) -> bool:
+        """True se almeno un client sta guardando lo stream."""
+        return bool(self._events)
+
+    # ── Ingresso / uscita ─────────────────────────────────────────────────────
+
+    def publish_raw(self, item):
+        """Consegna i dati grezzi di un frame; sostituisce quello non ancora codificato."""
+        with self._raw_cv:
+            self._raw.append(item)
+            self._raw_cv.notify()
+
+    def publish_jpeg(self, jpeg_bytes: bytes):
+        """Pubblica un JPEG già pronto (thread di encode o encoder hardware)."""
+        with self._pub_lock:
+            self._latest = (self._latest[0] + 1, jpeg_bytes)
+        for event in self._events:
+            event.set()
+
+    def latest(self) -> bytes | None:
+        """Ultimo JPEG pubblicato, None se non ancora disponibile."""
+        return self._latest[1]
+
+    def wait_jpeg(self, last_seq: int, timeout: float,
+                  event: threading.Event) -> tuple[int, bytes | None]:
+        """
+        Attende un JPEG più recente di last_seq (o fino a timeout) sull'Event
+        del client. Restituisce (seq, frame): se seq == last_seq non è
+        arrivato nulla di nuovo.
+        """
+        # clear() prima di leggere: una pubblicazione successiva alla
+        # lettura lascia l'Event impostato e wait() ritorna subito
+        event.clear()
+        seq, jpeg = self._latest
+        if seq == last_seq:
+            event.wait(timeout)
+            seq, jpeg = self._latest
+        return seq, jpeg
+
+    # ── Thread ────────────────────────────────────────────────────────────────
+
+    def _run(self):
+        # Core di servizio + SCHED_IDLE: mai in concorrenza con visione e PID
+        pin_cpus({self._cpu})
+        set_idle()
+
+        while self._running:
+            with self._raw_cv:
+                self._raw_cv.wait_for(lambda: self._raw or not self._running, timeout=0.5)
+                if not self._raw:
+                    continue
+                item = self._raw.popleft()
+
+            try:
+                img = self._render(item)
+                ok, jpeg = cv2.imencode(".jpg", img, self._params)
+                if ok:
+                    self.publish_jpeg(jpeg.tobytes())
+            except Exception as e:
+                log.warning(f"Errore encode frame di debug: {e}")
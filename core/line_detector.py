@@ -11,22 +11,83 @@ Errore: pixel dal centro (negativo=linea a sinistra, positivo=linea a destra).
 Architettura latenza-minima:
 - Il loop di controllo gira alla massima velocità (nessun sleep).
 - Il frame di debug viene encodato in JPEG solo se c'è un client web
-  connesso (_debug_requested), riducendo il carico CPU quando non serve.
+  connesso (DebugEncoder.active), riducendo il carico CPU quando non serve.
 - La rotazione fisica è gestita direttamente da Picamera2 (transform)
   invece di OpenCV, eliminando una copia in memoria per frame.
+- Con camera.hw_jpeg=true il JPEG di debug viene prodotto dall'encoder
+  MJPEG hardware di Picamera2 sullo stream "lores": le annotazioni sono
+  disegnate sul piano Y prima dell'encode e la CPU non esegue
+  cvtColor + imencode. Se l'encoder non è disponibile si torna
+  automaticamente all'encode software con OpenCV.
+- L'encode software (annotazioni + imencode) gira nel thread DebugEncoder,
+  sul core di servizio e con SCHED_IDLE: il loop di acquisizione si limita
+  a pubblicare i dati grezzi del frame.
 """
 
 import cv2
 import numpy as np
+import os
 import threading
 import time
-from picamera2 import Picamera2
-from libcamera import Transform
+from collections import deque, namedtuple
+from dataclasses import dataclass
+from picamera2 import Picamera2, MappedArray
+from picamera2.encoders import MJPEGEncoder, Quality
+from picamera2.outputs import Output
+from libcamera import Transform, controls as libcamera_controls
 from CFGReader import CFGReader
+from core._vision_kernels import HAVE_NUMBA, threshold_mask
+from core.debug_encoder import DebugEncoder
 from utils.logger import get_logger
+from utils.rt import pin_cpus
 
 log = get_logger("LineDetector")
 
+# Risultato di un frame: pubblicato in blocco con un solo assegnamento
+# timestamp_ns: SensorTimestamp del frame (inizio esposizione, ns), None se assente
+_Detection = namedtuple("_Detection", "error line_lost right_angle timestamp_ns")
+
+
+@dataclass(slots=True)
+class VisionCfg:
+    """Parametri di visione modificabili a runtime (update_settings)."""
+    threshold:        int
+    blur_k:           int
+    roi_top:          float
+    roi_bottom:       float
+    side_margin:      float
+    min_brightness:   int
+    continuity_power: float
+
+
+# Campo di VisionCfg → (sezione, chiave) in settings.cfg
+_VISION_CFG_KEYS = {
+    "threshold":        ("vision", "threshold_value"),
+    "blur_k":           ("vision", "blur_kernel"),
+    "roi_top":          ("vision", "roi_top_ratio"),
+    "roi_bottom":       ("vision", "roi_bottom_ratio"),
+    "side_margin":      ("vision", "side_margin_ratio"),
+    "min_brightness":   ("vision", "track_min_brightness"),
+    "continuity_power": ("line",   "continuity_weight_power"),
+}
+
+# ROI e margini in pixel, ricalcolati solo quando cambiano i rapporti.
+# rows_ds/margin_ds sono nelle coordinate ridotte (downsample);
+# row_mask è la riga 0/255 (larghezza ridotta) che azzera le colonne di margine.
+_RoiPx = namedtuple("_RoiPx", "top bottom margin rows_ds margin_ds row_mask")
+
+
+class _JpegSink(Output):
+    """Output Picamera2 che consegna ogni JPEG prodotto dall'encoder a una callback."""
+
+    def __init__(self, on_frame):
+        super().__init__()
+        self._on_frame = on_frame
+
+    def outputframe(self, frame, *args, **kwargs):
+        # Il buffer dell'encoder viene riutilizzato: va copiato
+        self._on_frame(bytes(frame))
+
 
 class LineDetector:
     """
@@ -36,9 +97,13 @@ class LineDetector:
         start() / stop()          — avvia/ferma la camera
         get_error()               — errore corrente in pixel
         get_debug_frame()         — JPEG annotato per il web server
+        wait_debug_frame()        — attende il prossimo JPEG di debug
+        add_debug_client()        — registra un client dello stream (abilita l'encode)
+        remove_debug_client()     — rimuove un client dello stream
         is_line_lost()            — True se la linea non è visibile
         is_right_angle()          — True se rilevato angolo retto
-        request_debug_frame()     — segnala che c'è un client web attivo
+        wait_frame()              — attende il prossimo frame elaborato
+        snapshot()                — risultato completo del frame in una lettura
     """
 
     def __init__(self, config_file: str = "settings.cfg"):
@@ -51,40 +116,79 @@ class LineDetector:
         self._height   = cfg.read("camera", "height")
         self._fps      = cfg.read("camera", "fps")
         self._rotation = cfg.read("camera", "rotation")
-
-        # Vision
-        self._threshold      = cfg.read("vision", "threshold_value")
-        self._blur_k         = cfg.read("vision", "blur_kernel")
-        self._roi_top        = cfg.read("vision", "roi_top_ratio")
-        self._roi_bottom     = cfg.read("vision", "roi_bottom_ratio")
-        self._side_margin    = cfg.read("vision", "side_margin_ratio")
-        self._min_brightness = cfg.read("vision", "track_min_brightness")
+        self._hw_jpeg  = cfg.read("camera", "hw_jpeg")
+        # ISP: denoise in hardware ed esposizione fissa (niente deriva AE)
+        self._isp_denoise   = cfg.read("camera", "isp_denoise")
+        self._auto_exposure = cfg.read("camera", "auto_exposure")
+        self._exposure_time = cfg.read("camera", "exposure_time")
+        self._analogue_gain = cfg.read("camera", "analogue_gain")
+
+        # Vision: letti una volta in un dataclass, nel loop solo accessi ad attributo
+        self._vcfg = VisionCfg(**{field: cfg.read(section, key)
+                                  for field, (section, key) in _VISION_CFG_KEYS.items()})
+        # CFGReader legge "1"/"0" come booleani: blur_kernel = 1 arriverebbe True
+        self._vcfg.blur_k    = int(self._vcfg.blur_k)
+        self._vcfg.threshold = int(self._vcfg.threshold)
+        # Fattore di riduzione della ROI prima della soglia (1 = risoluzione piena)
+        self._downsample     = max(1, int(cfg.read("vision", "downsample")))
 
         # Line detection
-        self._continuity_power = cfg.read("line", "continuity_weight_power")
         self._max_memory       = cfg.read("line", "max_frames_memory")
         self._ra_threshold     = cfg.read("line", "right_angle_error_threshold")
         self._ra_enabled       = cfg.read("line", "right_angle_enabled")
 
         # Stato interno
-        self._error        = 0.0
-        self._line_lost    = True
-        self._right_angle  = False
-        self._debug_frame  = None
-        self._prev_centers = []
+        # Ultimo risultato: namedtuple immutabile sostituita per intero a ogni
+        # frame (assegnamento atomico sotto il GIL) → letture senza lock.
+        # Il lock protegge solo i parametri di visione.
+        self._detection    = _Detection(0.0, True, False, None)
+        self._frame_event  = threading.Event()   # segnalato a ogni frame elaborato
+        # Ultimi centri linea: la deque scarta da sola i più vecchi (append O(1))
+        self._prev_centers = deque(maxlen=self._max_memory)
         self._lock         = threading.Lock()
         self._running      = False
         self._thread       = None
         self._camera       = None
 
-        # Flag: encode JPEG solo se qualcuno lo sta guardando
-        # Viene aggiornato dal generatore MJPEG ogni volta che serve un frame
-        self._debug_requested  = False
-        self._debug_request_ts = 0.0   # timestamp dell'ultima richiesta
-        self._DEBUG_TIMEOUT    = 3.0   # secondi: se nessuno chiede, smette di encodare
+        # Encode JPEG del frame di debug: thread DebugEncoder sul core di servizio
+        # (lo stesso del web server), attivo solo con client collegati
+        web_cpu            = int(cfg.read("web", "cpu"))
+        self._encoder      = DebugEncoder(self._render_debug, cpu=web_cpu)
+        # Core della visione: tutti tranne servizio e controllo. Impostati
+        # esplicitamente dal loop: start() può arrivare da un thread del web
+        # server confinato sul core di servizio, la cui affinità verrebbe ereditata
+        control_cpu        = int(cfg.read("pid", "control_cpu"))
+        self._cpus         = (set(range(os.cpu_count() or 1)) - {web_cpu, control_cpu}
+                              or set(range(os.cpu_count() or 1)))
+        # Scena statica: somma del piano Y e overlay (linea, ROI) dell'ultimo frame
+        # accodato. Se non cambiano, il JPEG precedente è ancora valido.
+        self._last_y_sum   = None
+        self._last_debug_pos = None
+        self._static_eps   = (self._width * self._height) // 2   # ~0.5 livelli/pixel
+
+        # Encoder JPEG hardware (solo con hw_jpeg): attivo solo mentre serve
+        self._hw_encoder  = None
+        self._hw_encoding = False
+        # Ultimi risultati da disegnare sul frame lores prima dell'encode
+        self._overlay     = None
 
         # Centro orizzontale del frame
         self._cx = self._width // 2
+        # Con rotation=180 l'asse X è specchiato:
+        # linea a destra nel frame → fisicamente a sinistra → errore negativo
+        self._err_sign = -1.0 if self._rotation == 180 else 1.0
+
+        self._MIN_MASS = 50    # pixel minimi perché un blob sia la linea
+
+        self._roi_px = None
+        self._update_roi_px()
+
+        # Buffer riusati tra i frame (allocati in start() da _alloc_buffers)
+        self._small_buf  = None   # ROI ridotta (downsample)
+        self._blur_buf   = None   # ROI sfocata (percorso OpenCV)
+        self._binary_buf = None   # maschera binaria
+        self._labels_buf = None   # etichette dei blob (connectedComponents)
+        self._debug_buf  = None   # frame di debug BGR
 
     # ── Camera lifecycle ───────────────────────────────────────────────────────
 
@@ -102,26 +206,101 @@ class LineDetector:
         elif self._rotation == 270:
             transform = Transform(rotation=270)
 
+        # Stream lores (stessa risoluzione, YUV420) dedicato all'encoder MJPEG
+        lores = {"size": (self._width, self._height), "format": "YUV420"} if self._hw_jpeg else None
         config = self._camera.create_preview_configuration(
-            main={"size": (self._width, self._height), "format": "RGB888"},
+            # YUV420: il piano Y (luminanza) è già la scala di grigi, niente cvtColor
+            main={"size": (self._width, self._height), "format": "YUV420"},
+            lores=lores,
             transform=transform,
-            controls={"FrameRate": self._fps},
-            buffer_count=2,   # solo 2 buffer: meno latenza, meno memoria
+            controls=self._camera_controls(),
+            # 3 buffer: uno resta mappato durante _process (cattura zero-copy)
+            # senza bloccare l'ISP, che continua a riempire gli altri due
+            buffer_count=3,
         )
         self._camera.configure(config)
+        if self._hw_jpeg:
+            self._hw_encoder = MJPEGEncoder()
+            self._camera.pre_callback = self._draw_overlay_hw
         self._camera.start()
+
+        self._alloc_buffers()
+        if HAVE_NUMBA:
+            # Prima chiamata = compilazione JIT: meglio farla qui che sul primo frame.
+            # Due layout: ROI contigua e vista con stride (piano Y con padding).
+            buf = self._binary_buf
+            threshold_mask(buf, self._vcfg.threshold, 0, 3, np.empty_like(buf))
+            strided = buf[:, :-1]
+            threshold_mask(strided, self._vcfg.threshold, 0, 3, np.empty(strided.shape, np.uint8))
+
         time.sleep(0.3)  # warm-up camera
 
         self._running = True
         self._thread = threading.Thread(target=self._loop, daemon=True, name="LineDetector")
         self._thread.start()
+        # Avviato anche con hw_jpeg: serve se l'encoder hardware fallisce
+        self._encoder.start()
         log.info(f"Camera avviata {self._width}x{self._height} @{self._fps}fps rot={self._rotation}°")
 
+    def _camera_controls(self) -> dict:
+        """
+        Controlli ISP applicati all'avvio.
+        - Denoise spaziale HighQuality dell'ISP: con questo il blur OpenCV
+          non serve più (blur_kernel = 1 in settings.cfg).
+        - Esposizione e guadagno fissi: con l'AE attivo la luminosità oscilla
+          tra un frame e l'altro e la soglia fissa con lei.
+        I controlli non supportati dal sensore vengono saltati.
+        """
+        available = self._camera.camera_controls
+        ctrl = {"FrameRate": self._fps}
+        if self._isp_denoise and "NoiseReductionMode" in available:
+            ctrl["NoiseReductionMode"] = libcamera_controls.draft.NoiseReductionModeEnum.HighQuality
+        if not self._auto_exposure and "ExposureTime" in available:
+            ctrl["AeEnable"]     = False
+            ctrl["ExposureTime"] = self._exposure_time
+            ctrl["AnalogueGain"] = float(self._analogue_gain)
+        return ctrl
+
+    def _alloc_buffers(self):
+        """
+        Alloca una volta i buffer di lavoro di _process.
+        Altezza piena: la ROI può cambiare a runtime, si usa una slice di righe
+        (resta contigua, quindi OpenCV scrive direttamente nel buffer passato
+        come dst invece di allocarne uno nuovo a ogni frame).
+        """
+        ds = self._downsample
+        small = (self._height // ds, self._width // ds)
+        self._small_buf  = np.empty(small, np.uint8)
+        self._blur_buf   = np.empty(small, np.uint8)
+        self._binary_buf = np.empty(small, np.uint8)
+        self._labels_buf = np.empty(small, np.int32)
+        self._debug_buf  = np.empty((self._height, self._width, 3), np.uint8)
+
+    def _update_roi_px(self):
+        """
+        Converte i rapporti ROI/margine in pixel. Chiamato all'avvio e da
+        update_settings(): _process usa i valori già pronti, pubblicati in
+        un'unica namedtuple così il loop non vede mai valori a metà.
+        """
+        h, w, ds = self._height, self._width, self._downsample
+        vc        = self._vcfg
+        top       = int(h * vc.roi_top)
+        bottom    = int(h * vc.roi_bottom)
+        margin    = int(w * vc.side_margin)
+        margin_ds = margin // ds
+        row_mask  = np.full(w // ds, 255, np.uint8)
+        if margin_ds > 0:
+            row_mask[:margin_ds]  = 0
+            row_mask[-margin_ds:] = 0
+        self._roi_px = _RoiPx(top, bottom, margin, (bottom - top) // ds, margin_ds, row_mask)
+
     def stop(self):
         """Ferma il thread e la camera."""
         self._running = False
         if self._thread:
             self._thread.join(timeout=2)
+        self._encoder.stop()
+        self._set_hw_encoding(False)
         if self._camera:
             self._camera.stop()
             self._camera.close()
@@ -132,49 +311,80 @@ class LineDetector:
     def _loop(self):
         """
         Loop principale: gira alla massima velocità senza sleep.
-        capture_array() con wait=True blocca fino al prossimo frame disponibile,
+        capture_request() blocca fino al prossimo frame disponibile,
         garantendo la latenza minima senza busy-wait.
+
+        Il frame non viene copiato: MappedArray espone il buffer DMA della
+        camera come vista numpy, valida solo fino a request.release().
+        _process è sincrono e copia ciò che passa ad altri thread.
         """
+        pin_cpus(self._cpus)
         while self._running:
             try:
-                frame = self._camera.capture_array()
-                self._process(frame)
+                request = self._camera.capture_request()
+                try:
+                    ts_ns = request.get_metadata().get("SensorTimestamp")
+                    with MappedArray(request, "main", write=False) as m:
+                        self._process(m.array, ts_ns)
+                finally:
+                    request.release()
             except Exception as e:
                 log.warning(f"Errore acquisizione frame: {e}")
                 time.sleep(0.05)
 
     # ── Elaborazione frame ────────────────────────────────────────────────────
 
-    def _process(self, frame: np.ndarray):
-        h, w = frame.shape[:2]
+    def _process(self, frame: np.ndarray, ts_ns: int | None = None):
+        # Frame YUV420: (h*3/2, stride). Le prime h righe sono il piano Y,
+        # cioè direttamente l'immagine in scala di grigi.
+        h, w = self._height, self._width
+        y_plane = frame[:h, :w]
+        vc = self._vcfg
 
         # ROI verticale
         # La camera è montata capovolta (rotation=180, gestita da Picamera2).
         # roi_top_ratio=0.55 → prendi dal 55% in giù = zona vicina al suolo.
-        roi_top    = int(h * self._roi_top)
-        roi_bottom = int(h * self._roi_bottom)
-        roi = frame[roi_top:roi_bottom, :]
-
-        # Margini laterali
-        margin = int(w * self._side_margin)
-
-        # Grayscale diretta sulla ROI (evita conversione sull'intero frame)
-        gray = cv2.cvtColor(roi, cv2.COLOR_RGB2GRAY)
-
-        # Blur solo se blur_k > 1 (a bassa risoluzione spesso non serve)
-        if self._blur_k > 1:
-            k = self._blur_k | 1  # forza dispari
-            gray = cv2.GaussianBlur(gray, (k, k), 0)
-
-        _, binary = cv2.threshold(gray, self._threshold, 255, cv2.THRESH_BINARY_INV)
-
-        # Maschera margini laterali
-        if margin > 0:
-            binary[:, :margin]   = 0
-            binary[:, w-margin:] = 0
-
-        # Trova contorni
-        contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        # ROI e margini laterali: pixel precalcolati da _update_roi_px
+        roi = self._roi_px
+        roi_top, roi_bottom, margin = roi.top, roi.bottom, roi.margin
+        gray = y_plane[roi_top:roi_bottom, :]
+
+        # Riduzione della ROI: soglia e centroide lavorano su ds² pixel in meno
+        ds = self._downsample
+        roi_h = roi.rows_ds
+        if ds > 1:
+            gray = cv2.resize(gray, (w // ds, roi_h), dst=self._small_buf[:roi_h],
+                              interpolation=cv2.INTER_AREA)
+        margin_ds = roi.margin_ds
+        binary = self._binary_buf[:roi_h]
+
+        # Stesso lato del kernel in entrambe le pipeline: 1 o dispari
+        k = (vc.blur_k | 1) if vc.blur_k > 1 else 1
+        if HAVE_NUMBA and k <= 5:
+            # Kernel Numba: box blur k x k + soglia + margini in un solo passaggio
+            threshold_mask(gray, vc.threshold, margin_ds, k, binary)
+        else:
+            # Blur solo se blur_k > 1 (a bassa risoluzione spesso non serve).
+            # Per kernel piccoli basta un box blur: boxFilter usa il percorso
+            # separabile intero di OpenCV, senza i pesi gaussiani.
+            if k > 1:
+                blur = self._blur_buf[:roi_h]
+                if k <= 5:
+                    gray = cv2.boxFilter(gray, -1, (k, k), dst=blur,
+                                         borderType=cv2.BORDER_REPLICATE)
+                else:
+                    gray = cv2.GaussianBlur(gray, (k, k), 0, dst=blur)
+
+            cv2.threshold(gray, vc.threshold, 255, cv2.THRESH_BINARY_INV, dst=binary)
+
+            # Maschera margini laterali: un solo AND vettoriale su tutta la ROI
+            # (broadcast della riga maschera) invece di due scritture a slice
+            if margin_ds > 0:
+                np.bitwise_and(binary, roi.row_mask, out=binary)
+
+        # Blob della maschera: area e centroide di tutti in una sola chiamata C
+        _, _, stats, centroids = cv2.connectedComponentsWithStats(
+            binary, labels=self._labels_buf[:roi_h], connectivity=8)
 
         error       = 0.0
         line_lost   = True
@@ -182,131 +392,223 @@ class LineDetector:
         cx_line     = self._cx
         cy_line     = roi_top + (roi_bottom - roi_top) // 2
 
-        if contours:
-            valid = [c for c in contours if cv2.contourArea(c) > 50]
-            if valid:
-                best = self._best_contour(valid)
-                M = cv2.moments(best)
-                if M["m00"] > 0:
-                    cx_line = int(M["m10"] / M["m00"])
-                    cy_line = int(M["m01"] / M["m00"]) + roi_top
-                    # Con rotation=180 l'asse X è specchiato:
-                    # linea a destra nel frame → fisicamente a sinistra → errore negativo
-                    raw_error = float(cx_line - self._cx)
-                    error     = -raw_error if self._rotation == 180 else raw_error
-                    line_lost = False
-
-                    self._prev_centers.append(cx_line)
-                    if len(self._prev_centers) > self._max_memory:
-                        self._prev_centers.pop(0)
-
-                    if self._ra_enabled and len(self._prev_centers) >= 3:
-                        recent = [abs(c - self._cx) for c in self._prev_centers[-3:]]
-                        if all(e > self._ra_threshold for e in recent):
-                            right_angle = True
+        best = self._best_blob(stats, centroids)
+        if best is not None:
+            # Centroide in coordinate ridotte, riportato a risoluzione piena
+            # (centro del blocco ds x ds; con ds=1 è il floor dei momenti)
+            cx_small, cy_small = centroids[best]
+            cx_line = int(cx_small * ds + (ds - 1) / 2)
+            cy_line = int(cy_small * ds + (ds - 1) / 2) + roi_top
+            error     = self._err_sign * (cx_line - self._cx)
+            line_lost = False
 
-        if line_lost:
-            self._prev_centers.clear()
+            self._prev_centers.append(cx_line)
 
-        # ── Debug frame: encode JPEG solo se richiesto ────────────────────
-        jpeg_bytes = None
-        now = time.monotonic()
-        debug_active = (now - self._debug_request_ts) < self._DEBUG_TIMEOUT
-
-        if debug_active:
-            debug = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-
-            # Linee di riferimento
-            cv2.line(debug, (margin, roi_top),   (margin, roi_bottom),   (255, 100, 0), 1)
-            cv2.line(debug, (w-margin, roi_top), (w-margin, roi_bottom), (255, 100, 0), 1)
-            cv2.line(debug, (0, roi_top),        (w, roi_top),           (0, 200, 255), 1)
-            cv2.line(debug, (self._cx, 0),       (self._cx, h),          (0, 255, 0),   1)
-
-            if not line_lost:
-                cv2.drawContours(debug, [best], -1, (0, 0, 255), 1, offset=(0, roi_top))
-                cv2.circle(debug, (cx_line, cy_line), 3, (0, 0, 255), -1)
-                cv2.line(debug, (self._cx, cy_line), (cx_line, cy_line), (0, 255, 255), 1)
-
-            mode_color = (0, 0, 255) if line_lost else (0, 255, 0)
-            mode_text  = "LOST" if line_lost else f"e={error:+.0f}"
-            if right_angle:
-                mode_text  = "ANGLE"
-                mode_color = (0, 165, 255)
-            cv2.putText(debug, mode_text, (2, 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.35, mode_color, 1)
-
-            # JPEG qualità 60: dimensione ridotta → meno dati in rete
-            _, jpeg = cv2.imencode(".jpg", debug, [cv2.IMWRITE_JPEG_QUALITY, 60])
-            jpeg_bytes = jpeg.tobytes()
+            if self._ra_enabled and len(self._prev_centers) >= 3:
+                recent = [abs(self._prev_centers[k] - self._cx) for k in (-3, -2, -1)]
+                if all(e > self._ra_threshold for e in recent):
+                    right_angle = True
 
-        with self._lock:
-            self._error       = error
-            self._line_lost   = line_lost
-            self._right_angle = right_angle
-            if jpeg_bytes is not None:
-                self._debug_frame = jpeg_bytes
+        if line_lost:
+            self._prev_centers.clear()
 
-    def _best_contour(self, contours: list):
+        # Risultato pubblicato prima del lavoro di debug: il controller non aspetta
+        self._detection = _Detection(error, line_lost, right_angle, ts_ns)
+        self._frame_event.set()
+
+        # ── Debug frame: encode JPEG solo con client collegati ────────────
+        debug_active = self._encoder.active
+
+        if self._hw_jpeg:
+            # L'encoder hardware legge lo stream lores: qui si pubblicano solo
+            # i dati per le annotazioni, disegnate da _draw_overlay_hw
+            self._overlay = (roi_top, roi_bottom, margin, cx_line, cy_line,
+                             error, line_lost, right_angle) if debug_active else None
+            self._set_hw_encoding(debug_active)
+
+        if debug_active and not self._hw_jpeg:
+            # Scena ferma (robot fermo, pausa angolo retto): niente nuovo encode
+            y_sum = int(y_plane.sum(dtype=np.int64))
+            pos   = (cx_line, line_lost, roi_top, roi_bottom, margin)
+            if (self._last_y_sum is not None and pos == self._last_debug_pos
+                    and abs(y_sum - self._last_y_sum) < self._static_eps):
+                return
+
+            # Annotazione + encode nel DebugEncoder. Piano Y (buffer della
+            # camera, rilasciato dopo _process) e maschera binaria (buffer
+            # riusato al prossimo frame) vanno passati come copie.
+            self._encoder.publish_raw((y_plane.copy(), binary.copy(), roi_top, roi_bottom, margin,
+                                       cx_line, cy_line, error, line_lost, right_angle))
+            self._last_y_sum     = y_sum
+            self._last_debug_pos = pos
+
+    def _render_debug(self, item) -> np.ndarray:
+        """
+        Callback del DebugEncoder (gira nel suo thread): frame di debug BGR
+        annotato a partire dai dati grezzi pubblicati da _process.
+        """
+        (y_plane, binary, roi_top, roi_bottom, margin,
+         cx_line, cy_line, error, line_lost, right_angle) = item
+        ds = self._downsample
+
+        # Frame di debug in scala di grigi (dal piano Y) con annotazioni a colori
+        debug = cv2.cvtColor(y_plane, cv2.COLOR_GRAY2BGR, dst=self._debug_buf)
+        if not line_lost:
+            # I contorni servono solo per l'overlay, non per il calcolo del centro
+            contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            if ds > 1:
+                # Scala in place: gli array di findContours sono già nostri
+                for c in contours:
+                    c *= ds
+            cv2.drawContours(debug, contours, -1, (0, 0, 255), 1, offset=(0, roi_top))
+        self._annotate(debug, roi_top, roi_bottom, margin, cx_line, cy_line,
+                       error, line_lost, right_angle)
+        return debug
+
+    def _annotate(self, img: np.ndarray, roi_top: int, roi_bottom: int, margin: int,
+                  cx_line: int, cy_line: int, error: float, line_lost: bool,
+                  right_angle: bool, gray: bool = False):
+        """
+        Disegna linee di riferimento, centro linea e stato sul frame di debug.
+        gray=True: immagine a un canale (piano Y), tutto disegnato in bianco.
         """
-        Sceglie il contorno più rilevante usando:
-        - area del contorno
-        - vicinanza al centro precedente (continuità)
+        h, w = img.shape[:2]
+
+        def c(bgr):
+            return 255 if gray else bgr
+
+        # Linee di riferimento
+        cv2.line(img, (margin, roi_top),   (margin, roi_bottom),   c((255, 100, 0)), 1)
+        cv2.line(img, (w-margin, roi_top), (w-margin, roi_bottom), c((255, 100, 0)), 1)
+        cv2.line(img, (0, roi_top),        (w, roi_top),           c((0, 200, 255)), 1)
+        cv2.line(img, (self._cx, 0),       (self._cx, h),          c((0, 255, 0)),   1)
+
+        if not line_lost:
+            cv2.circle(img, (cx_line, cy_line), 3, c((0, 0, 255)), -1)
+            cv2.line(img, (self._cx, cy_line), (cx_line, cy_line), c((0, 255, 255)), 1)
+
+        mode_color = (0, 0, 255) if line_lost else (0, 255, 0)
+        mode_text  = "LOST" if line_lost else f"e={error:+.0f}"
+        if right_angle:
+            mode_text  = "ANGLE"
+            mode_color = (0, 165, 255)
+        cv2.putText(img, mode_text, (2, 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.35, c(mode_color), 1)
+
+    # ── Encoder JPEG hardware ─────────────────────────────────────────────────
+
+    def _draw_overlay_hw(self, request):
+        """pre_callback Picamera2: annota il piano Y del frame lores prima dell'encode."""
+        overlay = self._overlay
+        if overlay is None or not self._hw_encoding:
+            return
+        with MappedArray(request, "lores") as m:
+            # YUV420: le prime height righe sono il piano Y (luminanza)
+            y_plane = m.array[:self._height, :self._width]
+            self._annotate(y_plane, *overlay, gray=True)
+
+    def _set_hw_encoding(self, active: bool):
+        """Avvia/ferma l'encoder MJPEG hardware. Se fallisce passa all'encode software."""
+        if active == self._hw_encoding or self._hw_encoder is None:
+            return
+        try:
+            if active:
+                self._camera.start_encoder(self._hw_encoder, _JpegSink(self._encoder.publish_jpeg),
+                                           name="lores", quality=Quality.LOW)
+            else:
+                self._camera.stop_encoder(self._hw_encoder)
+            self._hw_encoding = active
+        except Exception as e:
+            log.warning(f"Encoder JPEG hardware non disponibile ({e}) — uso encode software")
+            self._hw_jpeg     = False
+            self._hw_encoder  = None
+            self._hw_encoding = False
+
+    def _best_blob(self, stats: np.ndarray, centroids: np.ndarray):
         """
-        if not self._prev_centers:
+        Sceglie il blob più rilevante (indice di label, None se nessuno) usando:
+        - area del blob (sopra _MIN_MASS, scalata per il downsample)
+        - vicinanza al centro precedente (continuità):
+          area / (distanza + 1) ** continuity_power
+        Label 0 è lo sfondo ed è esclusa.
+        """
+        ds = self._downsample
+        areas = stats[1:, cv2.CC_STAT_AREA]
+        valid = areas > self._MIN_MASS // (ds * ds)
+        if not valid.any():
+            return None
+
+        if self._prev_centers:
+            last_cx = self._prev_centers[-1] / ds
+            score = areas / (np.abs(centroids[1:, 0] - last_cx) + 1.0) ** self._vcfg.continuity_power
+        else:
             # Primo frame: prendi il più grande
-            return max(contours, key=cv2.contourArea)
-
-        last_cx = self._prev_centers[-1]
-        best = None
-        best_score = -1
-
-        for c in contours:
-            area = cv2.contourArea(c)
-            if area < 100:
-                continue
-            M = cv2.moments(c)
-            if M["m00"] == 0:
-                continue
-            cx = int(M["m10"] / M["m00"])
-            dist = abs(cx - last_cx) + 1  # +1 evita div/0
-            # Score: area pesata dalla vicinanza al centro precedente
-            score = area / (dist ** self._continuity_power)
-            if score > best_score:
-                best_score = score
-                best = c
-
-        return best if best is not None else max(contours, key=cv2.contourArea)
+            score = areas.astype(np.float64)
+        score[~valid] = -1.0
+        return 1 + int(np.argmax(score))
 
     # ── API pubblica ──────────────────────────────────────────────────────────
 
+    def snapshot(self) -> _Detection:
+        """
+        Ultimo risultato completo (error, line_lost, right_angle, timestamp_ns),
+        coerente: i valori vengono dallo stesso frame. Da preferire ai getter
+        singoli quando servono più campi.
+        """
+        return self._detection
+
     def get_error(self) -> float:
         """Errore corrente in pixel (negativo=linea a sx, positivo=linea a dx)."""
-        with self._lock:
-            return self._error
+        return self._detection.error
 
-    def request_debug_frame(self):
+    def wait_frame(self, timeout: float = 0.1) -> bool:
         """
-        Segnala che c'è un client web che vuole il frame di debug.
-        Va chiamato dal generatore MJPEG ad ogni iterazione.
-        Se non viene chiamato per DEBUG_TIMEOUT secondi, l'encode JPEG
-        viene disabilitato automaticamente per risparmiare CPU.
+        Blocca finché non è disponibile un nuovo risultato (o fino a timeout).
+        Restituisce True se è arrivato un frame nuovo dall'ultima chiamata.
         """
-        self._debug_request_ts = time.monotonic()
+        if self._frame_event.wait(timeout):
+            self._frame_event.clear()
+            return True
+        return False
+
+    def add_debug_client(self) -> threading.Event:
+        """
+        Registra un client web che guarda lo stream di debug.
+        Finché c'è almeno un client il frame di debug viene codificato;
+        ogni add_debug_client() va bilanciato da remove_debug_client().
+        Restituisce l'Event del client, usato da wait_debug_frame().
+        """
+        return self._encoder.add_client()
+
+    def remove_debug_client(self, event: threading.Event):
+        """Rimuove un client dello stream: senza client l'encode JPEG si ferma."""
+        self._encoder.remove_client(event)
 
     def get_debug_frame(self) -> bytes | None:
         """Frame JPEG annotato per lo stream web. None se non ancora disponibile."""
-        with self._lock:
-            return self._debug_frame
+        return self._encoder.latest()
+
+    def wait_debug_frame(self, last_seq: int, timeout: float,
+                         event: threading.Event) -> tuple[int, bytes | None]:
+        """
+        Attende un JPEG più recente di last_seq (o fino a timeout).
+        event: quello restituito da add_debug_client() per questo client.
+        Restituisce (seq, frame): se seq == last_seq non è arrivato nulla di nuovo.
+        """
+        return self._encoder.wait_jpeg(last_seq, timeout, event)
 
     def is_line_lost(self) -> bool:
         """True se la linea non è visibile nel frame corrente."""
-        with self._lock:
-            return self._line_lost
+        return self._detection.line_lost
+
+    @property
+    def vision(self) -> VisionCfg:
+        """Parametri di visione correnti (per la web interface)."""
+        return self._vcfg
 
     def is_right_angle(self) -> bool:
         """True se è stato rilevato un angolo retto."""
-        with self._lock:
-            return self._right_angle
+        return self._detection.right_angle
 
     def update_settings(self, **kwargs):
         """
@@ -315,10 +617,12 @@ class LineDetector:
                        side_margin, continuity_power
         """
         with self._lock:
-            if "threshold"         in kwargs: self._threshold      = kwargs["threshold"]
-            if "blur_k"            in kwargs: self._blur_k         = kwargs["blur_k"]
-            if "roi_top"           in kwargs: self._roi_top        = kwargs["roi_top"]
-            if "roi_bottom"        in kwargs: self._roi_bottom     = kwargs["roi_bottom"]
-            if "side_margin"       in kwargs: self._side_margin    = kwargs["side_margin"]
-            if "continuity_power"  in kwargs: self._continuity_power = kwargs["continuity_power"]
+            vc = self._vcfg
+            if "threshold"         in kwargs: vc.threshold        = int(kwargs["threshold"])
+            if "blur_k"            in kwargs: vc.blur_k           = int(kwargs["blur_k"])
+            if "roi_top"           in kwargs: vc.roi_top          = kwargs["roi_top"]
+            if "roi_bottom"        in kwargs: vc.roi_bottom       = kwargs["roi_bottom"]
+            if "side_margin"       in kwargs: vc.side_margin      = kwargs["side_margin"]
+            if "continuity_power"  in kwargs: vc.continuity_power = kwargs["continuity_power"]
+            self._update_roi_px()
         log.info(f"Vision settings aggiornati: {kwargs}")
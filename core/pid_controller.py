@@ -5,12 +5,42 @@ Controllore PID puro. Riceve l'errore (px dal centro) e restituisce
 il valore di sterzo da passare a Engines.curve().
 """
 
+import logging
 import time
 from utils.logger import get_logger
 
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
 log = get_logger("PID")
 
 
+def _pid_step(err, dt, kp, ki, kd, dead_zone, max_integral, integral, last_error):
+    """
+    Passo PID puro (solo aritmetica, compilabile con Numba).
+    Restituisce (output, nuovo integrale, nuovo ultimo errore).
+    """
+    # Zona morta
+    if abs(err) < dead_zone:
+        err = 0.0
+
+    # Integrale con anti-windup
+    integral += err * dt
+    integral = max(-max_integral, min(max_integral, integral))
+
+    output = kp * err + ki * integral + kd * (err - last_error) / dt
+
+    # Clamp output
+    return max(-100.0, min(100.0, output)), integral, err
+
+
+if HAVE_NUMBA:
+    _pid_step = njit(cache=True)(_pid_step)
+
+
 class PIDController:
     """
     Controllore PID con:
@@ -30,6 +60,11 @@ class PIDController:
         self._integral   = 0.0
         self._last_error = 0.0
         self._last_time  = None
+        self._last_sensor = False   # _last_time viene da SensorTimestamp
+
+        if HAVE_NUMBA:
+            # Compilazione JIT qui, non al primo frame del loop di controllo
+            _pid_step(0.0, 0.033, 1.0, 0.0, 0.0, 0.0, 100.0, 0.0, 0.0)
 
     # ── Aggiornamento parametri live ──────────────────────────────────────────
 
@@ -53,46 +88,43 @@ class PIDController:
 
     # ── Calcolo ───────────────────────────────────────────────────────────────
 
-    def compute(self, error: float) -> float:
+    def compute(self, error: float, ts_ns: int | None = None) -> float:
         """
         Calcola l'output PID dato l'errore corrente.
 
         error:  distanza dal centro in pixel (negativo=sx, positivo=dx)
+        ts_ns:  timestamp del frame in ns (SensorTimestamp della camera).
+                Se presente dt è il tempo reale tra le esposizioni, senza il
+                jitter dello scheduling Python; altrimenti time.monotonic().
+                I due clock non sono confrontabili: al cambio di sorgente
+                quel passo usa il dt nominale, come il primo frame.
         return: valore di sterzo -100..+100
                 positivo = sterza a destra, negativo = sterza a sinistra
         """
-        now = time.monotonic()
-        if self._last_time is None:
-            dt = 0.033   # primo frame: assume ~30fps
+        sensor = ts_ns is not None
+        now = ts_ns * 1e-9 if sensor else time.monotonic()
+        if self._last_time is None or sensor != self._last_sensor:
+            dt = 0.033   # primo frame o cambio di clock: assume ~30fps
         else:
             dt = now - self._last_time
             dt = max(dt, 0.001)  # evita divisione per zero
-        self._last_time = now
-
-        # Zona morta
-        if abs(error) < self.dead_zone:
-            error = 0.0
-
-        # Proporzionale
-        p = self.kp * error
-
-        # Integrale con anti-windup
-        self._integral += error * dt
-        self._integral = max(-self.max_integral,
-                             min(self.max_integral, self._integral))
-        i = self.ki * self._integral
-
-        # Derivativo
-        derivative = (error - self._last_error) / dt
-        d = self.kd * derivative
-        self._last_error = error
-
-        output = p + i + d
-
-        # Clamp output
-        output = max(-100.0, min(100.0, output))
-
-        log.debug(f"err={error:+.1f} P={p:+.2f} I={i:+.2f} D={d:+.2f} → {output:+.2f}")
+        self._last_time   = now
+        self._last_sensor = sensor
+
+        last_error = self._last_error
+        # float(): i parametri da cfg possono essere int, e con Numba ogni
+        # combinazione di tipi diversa sarebbe una nuova compilazione
+        output, self._integral, self._last_error = _pid_step(
+            float(error), dt, float(self.kp), float(self.ki), float(self.kd),
+            float(self.dead_zone), float(self.max_integral), self._integral, last_error)
+
+        # Formattazione del messaggio solo se il livello DEBUG è attivo
+        if log.isEnabledFor(logging.DEBUG):
+            e = self._last_error
+            p = self.kp * e
+            i = self.ki * self._integral
+            d = self.kd * (e - last_error) / dt
+            log.debug(f"err={e:+.1f} P={p:+.2f} I={i:+.2f} D={d:+.2f} → {output:+.2f}")
         return output
 
     # ── Proprietà di stato ────────────────────────────────────────────────────
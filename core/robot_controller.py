@@ -12,44 +12,65 @@ tramite l'oggetto RobotState (thread-safe).
 
 import threading
 import time
+from collections import namedtuple
 from CFGReader import CFGReader
 from Engines import Engines
 from core.line_detector import LineDetector
 from core.pid_controller import PIDController
 from utils.logger import get_logger
+from utils.rt import pin_cpus, set_fifo
 
 log = get_logger("RobotController")
 
 
 # ── Stato condiviso ────────────────────────────────────────────────────────────
 
+_State = namedtuple("_State", "mode error steering speed running")
+
+
+def _published(s: _State) -> tuple:
+    """Valori esposti da snapshot(), arrotondati come nel JSON di /status."""
+    return (s.mode, round(s.error, 1), round(s.steering, 1), round(s.speed, 1), s.running)
+
+
 class RobotState:
-    """Oggetto thread-safe che contiene lo stato corrente del robot."""
+    """
+    Oggetto thread-safe che contiene lo stato corrente del robot.
+
+    Lo stato è una namedtuple immutabile: update() ne pubblica una nuova
+    con un solo assegnamento (atomico sotto il GIL), quindi i lettori
+    (snapshot(), state.mode, ...) non prendono mai il lock. Il lock
+    serializza solo gli scrittori, per non perdere aggiornamenti concorrenti.
+    """
 
     MODES = ("idle", "following", "searching", "right_angle", "stopped")
 
     def __init__(self):
         self._lock    = threading.Lock()
-        self.mode     = "idle"
-        self.error    = 0.0
-        self.steering = 0.0
-        self.speed    = 0.0
-        self.running  = False
+        self._state   = _State(mode="idle", error=0.0, steering=0.0, speed=0.0, running=False)
+        self._shown   = _published(self._state)
+        # Incrementato solo quando cambia un valore pubblicato (cache JSON del
+        # web server): update() gira a ogni frame, spesso senza cambiare nulla
+        self._version = 0
+
+    def __getattr__(self, name):
+        # Chiamato solo per gli attributi non trovati: mode, error, steering, ...
+        return getattr(self._state, name)
 
     def update(self, **kwargs):
         with self._lock:
-            for k, v in kwargs.items():
-                setattr(self, k, v)
+            self._state = self._state._replace(**kwargs)
+            shown = _published(self._state)
+            if shown != self._shown:
+                self._shown    = shown
+                self._version += 1
+
+    @property
+    def version(self) -> int:
+        return self._version
 
     def snapshot(self) -> dict:
-        with self._lock:
-            return {
-                "mode":     self.mode,
-                "error":    round(self.error, 1),
-                "steering": round(self.steering, 1),
-                "speed":    round(self.speed, 1),
-                "running":  self.running,
-            }
+        return dict(zip(_State._fields, self._shown))
 
 
 # ── Controller principale ──────────────────────────────────────────────────────
@@ -92,6 +113,14 @@ class RobotController:
         self._search_start   = None
         self._ra_enabled     = self._scfg.read("line", "right_angle_enabled")
 
+        # Scheduling del thread di controllo (0 = SCHED_OTHER normale)
+        self._rt_priority    = int(self._scfg.read("pid", "rt_priority"))
+        self._control_cpu    = int(self._scfg.read("pid", "control_cpu"))
+
+        # Versione dei parametri live: cambia a ogni update_* (cache del web server)
+        self._settings_ver  = 0
+        self._settings_lock = threading.Lock()   # invalidate_settings() dai worker HTTP
+
         # Thread
         self._running = False
         self._thread  = None
@@ -114,6 +143,15 @@ class RobotController:
     def engines(self) -> Engines:
         return self._engines
 
+    @property
+    def settings_version(self) -> int:
+        return self._settings_ver
+
+    def invalidate_settings(self):
+        """Segnala che un parametro live è cambiato (anche fuori dagli update_*)."""
+        with self._settings_lock:
+            self._settings_ver += 1
+
     # ── Lifecycle ─────────────────────────────────────────────────────────────
 
     def start(self):
@@ -123,7 +161,7 @@ class RobotController:
         self._detector.start()
         self._running = True
         self._state.update(running=True, mode="following")
-        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="RobotController")
         self._thread.start()
         log.info("RobotController avviato")
 
@@ -145,26 +183,37 @@ class RobotController:
     # ── Loop principale ────────────────────────────────────────────────────────
 
     def _loop(self):
+        # Thread di controllo: core dedicato e SCHED_FIFO, così il web server
+        # (SCHED_OTHER, core di servizio) non ne ritarda mai il risveglio
+        pin_cpus({self._control_cpu})
+        if self._rt_priority > 0:
+            set_fifo(self._rt_priority)
+
+        # Un'iterazione per frame elaborato: il PID gira alla cadenza della
+        # camera invece di ricalcolare in busy-loop sulla stessa misura.
         while self._running:
             try:
-                if self._detector.is_right_angle() and self._ra_enabled:
+                if not self._detector.wait_frame(timeout=0.1):
+                    continue
+                # Una sola lettura per iterazione: i tre valori sono dello stesso frame
+                det = self._detector.snapshot()
+                if det.right_angle and self._ra_enabled:
                     self._handle_right_angle()
-                elif self._detector.is_line_lost():
-                    self._handle_search()
+                elif det.line_lost:
+                    self._handle_search(det.error)
                 else:
-                    self._handle_follow()
+                    self._handle_follow(det.error, det.timestamp_ns)
             except Exception as e:
                 log.error(f"Errore nel loop: {e}")
                 self._engines.stop()
                 time.sleep(0.1)
 
-    def _handle_follow(self):
+    def _handle_follow(self, error: float, ts_ns: int | None = None):
         """Modalità line following normale con PID."""
         self._search_start = None   # reset timer ricerca
         self._pid.reset() if self._state.mode != "following" else None
 
-        error    = self._detector.get_error()
-        steering = self._pid.compute(error)
+        steering = self._pid.compute(error, ts_ns=ts_ns)
 
         # Velocità adattiva: rallenta se la curva è brusca
         speed = self._adaptive_speed(abs(steering))
@@ -181,7 +230,7 @@ class RobotController:
             speed=speed,
         )
 
-    def _handle_search(self):
+    def _handle_search(self, error: float):
         """Modalità ricerca linea: ruota nell'ultima direzione vista."""
         if self._search_start is None:
             self._search_start = time.monotonic()
@@ -206,7 +255,7 @@ class RobotController:
 
         self._state.update(
             mode="searching",
-            error=self._detector.get_error(),
+            error=error,
             steering=float(self._search_dir * speed),
             speed=0,
         )
@@ -243,10 +292,12 @@ class RobotController:
     def update_pid(self, **kwargs):
         """Aggiorna parametri PID a runtime."""
         self._pid.update_params(**kwargs)
+        self.invalidate_settings()
 
     def update_vision(self, **kwargs):
         """Aggiorna parametri visione a runtime."""
         self._detector.update_settings(**kwargs)
+        self.invalidate_settings()
 
     def update_speeds(self, **kwargs):
         """Aggiorna velocità motori a runtime."""
@@ -255,4 +306,5 @@ class RobotController:
         if "max_speed"   in kwargs: eng.max_speed   = kwargs["max_speed"]
         if "min_speed"   in kwargs: eng.min_speed   = kwargs["min_speed"]
         if "turn_speed"  in kwargs: eng.turn_speed  = kwargs["turn_speed"]
+        self.invalidate_settings()
         log.info(f"Speed settings aggiornati: {kwargs}")
@@ -11,6 +11,7 @@ Uso:
     python3 main.py              # avvia tutto e parte subito
     python3 main.py --no-robot   # solo web server (debug senza hardware)
     python3 main.py --no-web     # solo robot, senza web server
+    python3 main.py --log-level info   # log più verbosi (default: warning)
 
 Ctrl+C per fermare tutto.
 """
@@ -21,7 +22,7 @@ import signal
 import argparse
 from core.robot_controller import RobotController
 from web.server import WebServer
-from utils.logger import get_logger
+from utils.logger import get_logger, set_level, LEVELS
 
 log = get_logger("Main")
 
@@ -32,11 +33,14 @@ def parse_args():
     p.add_argument("--no-web",   action="store_true", help="Non avvia il web server (solo robot)")
     p.add_argument("--settings", default="settings.cfg", help="File settings (default: settings.cfg)")
     p.add_argument("--motors",   default="motors.cfg",   help="File motori (default: motors.cfg)")
+    p.add_argument("--log-level", default="warning", type=str.upper, choices=list(LEVELS),
+                   help="Livello di log (default: warning; modificabile da /settings/log)")
     return p.parse_args()
 
 
 def main():
     args = parse_args()
+    set_level(args.log_level)
 
     log.info("=" * 50)
     log.info("  RoboCup Jr Rescue Line — Avvio")
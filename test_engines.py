@@ -11,6 +11,7 @@ Uso:
 
 import time
 from Engines import Engines
+from utils.wait_enter import wait_enter, set_pump
 
 
 def separator(title: str = ""):
@@ -22,7 +23,7 @@ def separator(title: str = ""):
 
 
 def wait(msg: str = "Premi INVIO per continuare..."):
-    input(f"\n  [{msg}]")
+    wait_enter(f"\n  [{msg}]")
 
 
 def test_config(eng: Engines):
@@ -58,9 +59,9 @@ def test_singoli(eng: Engines):
         eng.set_motors(-fl, -fr, -rl, -rr)
         time.sleep(1)
         eng.stop()
-        time.sleep(0.3)
 
-        risposta = input("    La ruota girava nel verso giusto? (s/n): ").strip().lower()
+        # Assestamento di 0.3 s sovrapposto alla risposta dell'utente
+        risposta = wait_enter("    La ruota girava nel verso giusto? (s/n): ", settle=0.3).strip().lower()
         if risposta != "s":
             print("    ⚠  Segna l'inversione su motors.cfg per questa ruota!")
 
@@ -202,7 +203,7 @@ def menu(eng: Engines):
             print(f"║   {key})  {name:<40}║")
         print("╚══════════════════════════════════════════════╝")
 
-        scelta = input("  Scelta: ").strip()
+        scelta = wait_enter("  Scelta: ").strip()
         if scelta not in tests:
             print("  Scelta non valida.")
             continue
@@ -222,6 +223,8 @@ if __name__ == "__main__":
     print("\n  Inizializzazione Engines...")
     try:
         with Engines() as eng:
+            # Le scadenze dei movimenti restano puntuali anche in attesa di INVIO
+            set_pump(eng.tick)
             menu(eng)
     except FileNotFoundError as e:
         print(f"\n  ERRORE: {e}")
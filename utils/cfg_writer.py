@@ -5,8 +5,88 @@ Funzione per aggiornare i valori in un file .cfg stile INI
 preservando commenti, ordine e struttura originale.
 """
 
+import mmap
+import os
+import re
+import shutil
+import tempfile
 
-def save_settings(file_path: str, updates: dict):
+# Primo carattere di una riga di commento
+_COMMENT_START = frozenset("#;/")
+
+# Intestazione di sezione "[nome]" e riga "chiave = valore" (indentazione, chiave)
+_SECTION_RE = re.compile(r"^\s*\[([^\]]+)\]")
+_KV_RE      = re.compile(r"^(\s*)([^\s=]+)\s*=")
+
+# Stesse righe, cercate direttamente nel file mappato (bytes, multilinea);
+# _VALUE_RE_B cattura anche il valore grezzo fino a fine riga
+_SECTION_RE_B = re.compile(rb"^[ \t]*\[([^\]\r\n]+)\]", re.M)
+_VALUE_RE_B   = re.compile(rb"^[ \t]*([^\s=]+)[ \t]*=[ \t]*([^\r\n]*)", re.M)
+
+
+def _format(val) -> str:
+    # Numero: togli zeri trailing inutili ma mantieni precisione
+    return f"{val:.6g}" if isinstance(val, float) else str(val)
+
+
+def _value_len(raw: bytes) -> int:
+    """
+    Lunghezza del valore in raw (testo dopo '='), senza commento inline
+    e spazi finali. Stesse regole di CFGReader: ';' e '#' ovunque, '//'
+    solo a inizio valore o dopo uno spazio.
+    """
+    end = len(raw)
+    for marker in (b";", b"#"):
+        pos = raw.find(marker)
+        if 0 <= pos < end:
+            end = pos
+    pos = raw.find(b"//")
+    while 0 <= pos < end:
+        if pos == 0 or raw[pos - 1:pos].isspace():
+            end = pos
+            break
+        pos = raw.find(b"//", pos + 2)
+    return len(raw[:end].rstrip())
+
+
+def _update_in_place(file_path: str, updates: dict) -> bool:
+    """
+    Sovrascrive i valori direttamente nel file mappato in memoria, senza
+    riscriverlo: ogni nuovo valore occupa lo spazio del vecchio, completato
+    con spazi se più corto. Tutto o niente: se anche un solo valore non
+    entra restituisce False senza aver scritto nulla.
+    """
+    with open(file_path, "r+b") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return False
+        with mmap.mmap(f.fileno(), 0) as mm:
+            # Confini delle sezioni: (nome, inizio corpo, fine corpo)
+            heads = list(_SECTION_RE_B.finditer(mm))
+            patches = []
+            for i, head in enumerate(heads):
+                section_updates = updates.get(head.group(1).strip().lower().decode("utf-8"))
+                if section_updates is None:
+                    continue
+                end = heads[i + 1].start() if i + 1 < len(heads) else len(mm)
+                for m in _VALUE_RE_B.finditer(mm, head.end(), end):
+                    key = m.group(1).lower().decode("utf-8")
+                    if key[0] in _COMMENT_START or key not in section_updates:
+                        continue
+                    old_len = _value_len(m.group(2))
+                    new = _format(section_updates[key]).encode("utf-8")
+                    if len(new) > old_len:
+                        return False
+                    if new != m.group(2)[:old_len]:
+                        patches.append((m.start(2), new.ljust(old_len)))
+
+            for pos, data in patches:
+                mm[pos:pos + len(data)] = data
+            if patches:
+                mm.flush()
+    return True
+
+
+def save_settings(file_path: str, updates: dict, *, normalized: bool = False):
     """
     Aggiorna i valori nel file .cfg preservando commenti e struttura.
 
@@ -16,49 +96,70 @@ def save_settings(file_path: str, updates: dict):
             "pid": {"kp": 0.8, "ki": 0.005},
             "camera": {"servo_camera_angle": 95},
         })
-    """
-    with open(file_path, "r", encoding="utf-8") as f:
-        lines = f.readlines()
 
+    Caso comune (es. un solo slider cambiato): se ogni nuovo valore entra
+    nello spazio del vecchio, i byte vengono sovrascritti in place e il
+    file non viene riscritto (meno scritture sulla SD). Uno spegnimento a
+    metà può lasciare aggiornati solo alcuni valori, mai un file troncato.
+
+    Altrimenti scrittura atomica: il nuovo contenuto va in un file
+    temporaneo nella stessa cartella, che poi sostituisce l'originale con
+    os.replace(). Uno spegnimento a metà salvataggio lascia il vecchio
+    file intatto.
+
+    normalized=True: sezioni e chiavi di updates sono già in minuscolo
+    (es. dict costruito una volta e riusato), la normalizzazione è saltata.
+    """
     # Normalizza le chiavi degli updates in lowercase
-    normalized = {
-        sec.lower(): {k.lower(): v for k, v in vals.items()}
-        for sec, vals in updates.items()
-    }
-
-    new_lines = []
-    current_section = None
-
-    for line in lines:
-        stripped = line.strip()
-
-        # Sezione
-        if stripped.startswith("[") and "]" in stripped:
-            current_section = stripped[1:stripped.find("]")].strip().lower()
-            new_lines.append(line)
-            continue
-
-        # Riga vuota o commento → lascia invariata
-        if not stripped or stripped[0] in ("#", ";", "/"):
-            new_lines.append(line)
-            continue
-
-        # Riga key = value
-        if "=" in stripped and current_section in normalized:
-            key_part = stripped.split("=")[0].strip().lower()
-            if key_part in normalized[current_section]:
-                val = normalized[current_section][key_part]
-                # Formattazione: mantieni indentazione originale
-                indent = line[: len(line) - len(line.lstrip())]
-                # Numero: togli zeri trailing inutili ma mantieni precisione
-                if isinstance(val, float):
-                    formatted = f"{val:.6g}"
-                else:
-                    formatted = str(val)
-                new_lines.append(f"{indent}{key_part} = {formatted}\n")
-                continue
-
-        new_lines.append(line)
-
-    with open(file_path, "w", encoding="utf-8") as f:
-        f.writelines(new_lines)
+    if not normalized:
+        updates = {
+            sec.lower(): {k.lower(): v for k, v in vals.items()}
+            for sec, vals in updates.items()
+        }
+
+    if _update_in_place(file_path, updates):
+        return
+
+    directory = os.path.dirname(os.path.abspath(file_path))
+    tmp = tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory,
+                                      prefix=".cfg_", delete=False)
+    try:
+        with open(file_path, "r", encoding="utf-8") as src, tmp:
+            section_updates = None
+
+            for line in src:
+                # Sezione
+                m = _SECTION_RE.match(line)
+                if m:
+                    section_updates = updates.get(m.group(1).strip().lower())
+                    tmp.write(line)
+                    continue
+
+                # Riga key = value in una sezione da aggiornare (commenti esclusi)
+                if section_updates is not None:
+                    m = _KV_RE.match(line)
+                    if m and m.group(2)[0] not in _COMMENT_START:
+                        key = m.group(2).lower()
+                        if key in section_updates:
+                            # Mantieni l'indentazione originale
+                            tmp.write(f"{m.group(1)}{key} = {_format(section_updates[key])}\n")
+                            continue
+
+                tmp.write(line)
+
+            tmp.flush()
+            os.fsync(tmp.fileno())
+
+        shutil.copymode(file_path, tmp.name)
+        os.replace(tmp.name, file_path)
+    except BaseException:
+        os.unlink(tmp.name)
+        raise
+
+    # Il rename è durevole solo dopo l'fsync della directory: senza, uno
+    # spegnimento subito dopo il salvataggio può ancora perdere il nuovo file
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -14,17 +14,33 @@ Per ogni motore il programma:
 Al termine stampa un riepilogo da usare per compilare motors.cfg
 """
 
-import RPi.GPIO as GPIO
+import re
 import time
 from CFGReader import CFGReader
+from utils.wait_enter import wait_enter
+
+# lgpio usa il character device /dev/gpiochip (funziona anche su Pi 5);
+# senza lgpio si ricade su RPi.GPIO
+try:
+    import lgpio
+except ImportError:
+    lgpio = None
+    import RPi.GPIO as GPIO
+
+try:
+    import pigpio
+except ImportError:
+    pigpio = None
+
+# Intestazione di sezione "[nome]" e riga "chiave = valore" (per _update_cfg)
+_SECTION_RE = re.compile(r"^\s*\[([^\]]+)\]")
+_KV_RE      = re.compile(r"^(\s*)([^\s=]+)\s*=")
 
 # ── Carica configurazione ──────────────────────────────────────────────────────
 cfg = CFGReader("motors.cfg")
 if not cfg:
     raise FileNotFoundError("File motors.cfg non trovato!")
 
-GPIO.setmode(GPIO.BCM)
-
 # ── Pin driver 1 ───────────────────────────────────────────────────────────────
 AIN1_1 = cfg.read("driver1", "ain1")
 AIN2_1 = cfg.read("driver1", "ain2")
@@ -46,20 +62,91 @@ PWMB_2 = cfg.read("driver2", "pwmb")
 PWM_FREQ = cfg.read("pwm", "frequency")
 
 # ── Setup GPIO ─────────────────────────────────────────────────────────────────
-all_pins = [
-    AIN1_1, AIN2_1, PWMA_1,
-    BIN1_1, BIN2_1, PWMB_1,
-    AIN1_2, AIN2_2, PWMA_2,
-    BIN1_2, BIN2_2, PWMB_2,
+dir_pins = [
+    AIN1_1, AIN2_1, BIN1_1, BIN2_1,
+    AIN1_2, AIN2_2, BIN1_2, BIN2_2,
 ]
-for pin in all_pins:
-    GPIO.setup(pin, GPIO.OUT)
-    GPIO.output(pin, GPIO.LOW)
-
-pwmA1 = GPIO.PWM(PWMA_1, PWM_FREQ)
-pwmB1 = GPIO.PWM(PWMB_1, PWM_FREQ)
-pwmA2 = GPIO.PWM(PWMA_2, PWM_FREQ)
-pwmB2 = GPIO.PWM(PWMB_2, PWM_FREQ)
+pwm_pins = [PWMA_1, PWMB_1, PWMA_2, PWMB_2]
+
+if lgpio is not None:
+    h = lgpio.gpiochip_open(0)
+    # Un solo ioctl: tutte le linee di direzione in uscita e già a LOW,
+    # nessun impulso spurio ai motori durante il setup
+    lgpio.group_claim_output(h, dir_pins, [0] * len(dir_pins))
+    _bit = {pin: 1 << i for i, pin in enumerate(dir_pins)}
+
+    def _write_dir(in1: int, v1: int, in2: int, v2: int):
+        # Entrambi i pin del canale con un solo group_write
+        lgpio.group_write(h, dir_pins[0],
+                          (_bit[in1] if v1 else 0) | (_bit[in2] if v2 else 0),
+                          _bit[in1] | _bit[in2])
+else:
+    GPIO.setmode(GPIO.BCM)
+    for pin in dir_pins + pwm_pins:
+        GPIO.setup(pin, GPIO.OUT)
+        GPIO.output(pin, GPIO.LOW)
+
+    def _write_dir(in1: int, v1: int, in2: int, v2: int):
+        GPIO.output([in1, in2], [v1, v2])
+
+# ── PWM ────────────────────────────────────────────────────────────────────────
+# Con pigpio il PWM è generato via DMA dal demone pigpiod: il duty cycle
+# non risente dello scheduling dei thread Python. Senza pigpio (o con
+# pigpiod spento) si usa il PWM software di lgpio o di RPi.GPIO.
+class _PigpioPWM:
+    """Stessa interfaccia di GPIO.PWM, con PWM temporizzato da pigpiod."""
+
+    def __init__(self, pi, pin: int, freq: int):
+        self._pi  = pi
+        self._pin = pin
+        pi.set_PWM_frequency(pin, freq)
+        pi.set_PWM_range(pin, 100)   # duty cycle in %, come RPi.GPIO
+
+    def start(self, duty: float):
+        self.ChangeDutyCycle(duty)
+
+    def ChangeDutyCycle(self, duty: float):
+        self._pi.set_PWM_dutycycle(self._pin, int(round(duty)))
+
+    def stop(self):
+        self._pi.set_PWM_dutycycle(self._pin, 0)
+
+
+class _LgpioPWM:
+    """Stessa interfaccia di GPIO.PWM, con il PWM di lgpio."""
+
+    def __init__(self, h, pin: int, freq: int):
+        self._h    = h
+        self._pin  = pin
+        self._freq = freq
+        lgpio.gpio_claim_output(h, pin, 0)
+
+    def start(self, duty: float):
+        self.ChangeDutyCycle(duty)
+
+    def ChangeDutyCycle(self, duty: float):
+        lgpio.tx_pwm(self._h, self._pin, self._freq, duty)
+
+    def stop(self):
+        lgpio.tx_pwm(self._h, self._pin, self._freq, 0)
+
+
+pi = pigpio.pi() if pigpio is not None else None
+if pi is not None and not pi.connected:
+    print("  pigpiod non in esecuzione (avvialo con: sudo pigpiod) — uso il PWM software")
+    pi = None
+
+def _make_pwm(pin: int):
+    if pi is not None:
+        return _PigpioPWM(pi, pin, PWM_FREQ)
+    if lgpio is not None:
+        return _LgpioPWM(h, pin, PWM_FREQ)
+    return GPIO.PWM(pin, PWM_FREQ)
+
+pwmA1 = _make_pwm(PWMA_1)
+pwmB1 = _make_pwm(PWMB_1)
+pwmA2 = _make_pwm(PWMA_2)
+pwmB2 = _make_pwm(PWMB_2)
 
 for p in [pwmA1, pwmB1, pwmA2, pwmB2]:
     p.start(0)
@@ -69,13 +156,11 @@ TEST_DUTY  = 60   # % duty cycle durante il test (abbassa se il robot si muove t
 TEST_TIME  = 1.5  # secondi per ogni direzione
 
 def _run(in1, in2, pwm, forward: bool):
-    GPIO.output(in1, GPIO.HIGH if forward else GPIO.LOW)
-    GPIO.output(in2, GPIO.LOW  if forward else GPIO.HIGH)
+    _write_dir(in1, 1 if forward else 0, in2, 0 if forward else 1)
     pwm.ChangeDutyCycle(TEST_DUTY)
 
 def _stop(in1, in2, pwm):
-    GPIO.output(in1, GPIO.LOW)
-    GPIO.output(in2, GPIO.LOW)
+    _write_dir(in1, 0, in2, 0)
     pwm.ChangeDutyCycle(0)
 
 def test_motor(label: str, in1: int, in2: int, pwm) -> dict:
@@ -83,18 +168,17 @@ def test_motor(label: str, in1: int, in2: int, pwm) -> dict:
     print(f"\n{'='*55}")
     print(f"  MOTORE: {label}")
     print(f"{'='*55}")
-    input("  Premi INVIO per far girare il motore AVANTI...")
+    wait_enter("  Premi INVIO per far girare il motore AVANTI...")
 
     _run(in1, in2, pwm, forward=True)
     time.sleep(TEST_TIME)
     _stop(in1, in2, pwm)
-    time.sleep(0.3)
 
-    input("  Premi INVIO per far girare il motore INDIETRO...")
+    # Assestamento di 0.3 s prima dell'inversione, sovrapposto all'attesa di INVIO
+    wait_enter("  Premi INVIO per far girare il motore INDIETRO...", settle=0.3)
     _run(in1, in2, pwm, forward=False)
     time.sleep(TEST_TIME)
     _stop(in1, in2, pwm)
-    time.sleep(0.3)
 
     print()
     print("  Quale ruota hai visto girare?")
@@ -109,7 +193,7 @@ def test_motor(label: str, in1: int, in2: int, pwm) -> dict:
         "4": "rear_left",
     }
     while True:
-        pos = input("  Scelta (1-4): ").strip()
+        pos = wait_enter("  Scelta (1-4): ").strip()
         if pos in scelta_pos:
             position = scelta_pos[pos]
             break
@@ -120,7 +204,7 @@ def test_motor(label: str, in1: int, in2: int, pwm) -> dict:
     print("    1) In avanti  → nessuna inversione (inversion = 1)")
     print("    2) All'indietro → motore invertito  (inversion = -1)")
     while True:
-        inv = input("  Scelta (1/2): ").strip()
+        inv = wait_enter("  Scelta (1/2): ").strip()
         if inv == "1":
             inversion = 1
             break
@@ -150,7 +234,7 @@ print()
 print("  Solleva il robot da terra prima di procedere!")
 print("  Il robot NON deve toccare il suolo durante il test.")
 print()
-input("  Premi INVIO quando sei pronto...")
+wait_enter("  Premi INVIO quando sei pronto...")
 
 try:
     for label, in1, in2, pwm, cfg_key in motors:
@@ -176,7 +260,7 @@ try:
     print()
 
     # Salva automaticamente su file
-    save = input("  Vuoi aggiornare automaticamente motors.cfg? (s/n): ").strip().lower()
+    save = wait_enter("  Vuoi aggiornare automaticamente motors.cfg? (s/n): ").strip().lower()
     if save == "s":
         _update_cfg(results)
         print("\n  ✓ motors.cfg aggiornato!")
@@ -189,7 +273,12 @@ except KeyboardInterrupt:
 finally:
     for p in [pwmA1, pwmB1, pwmA2, pwmB2]:
         p.stop()
-    GPIO.cleanup()
+    if pi is not None:
+        pi.stop()
+    if lgpio is not None:
+        lgpio.gpiochip_close(h)
+    else:
+        GPIO.cleanup()
     print("GPIO liberato. Arrivederci!")
 
 
@@ -202,25 +291,21 @@ def _update_cfg(results: list):
     inversion = {r["cfg_key"]: r["inversion"] for r in results}
 
     new_lines = []
-    section = None
+    values = None
     for line in lines:
-        stripped = line.strip().lower()
-        if stripped.startswith("[") and "]" in stripped:
-            section = stripped[1:stripped.find("]")]
+        m = _SECTION_RE.match(line)
+        if m:
+            section = m.group(1).strip().lower()
+            values = {"motor_mapping": mapping, "motor_inversion": inversion}.get(section)
             new_lines.append(line)
             continue
 
-        if section == "motor_mapping":
-            if "=" in line:
-                key = line.split("=")[0].strip().lower()
-                if key in mapping:
-                    new_lines.append(f"{key} = {mapping[key]}\n")
-                    continue
-        elif section == "motor_inversion":
-            if "=" in line:
-                key = line.split("=")[0].strip().lower()
-                if key in inversion:
-                    new_lines.append(f"{key} = {inversion[key]}\n")
+        if values is not None:
+            m = _KV_RE.match(line)
+            if m:
+                key = m.group(2).lower()
+                if key in values:
+                    new_lines.append(f"{key} = {values[key]}\n")
                     continue
 
         new_lines.append(line)
@@ -2,13 +2,29 @@
 utils/logger.py
 ---------------
 Logger condiviso per tutti i moduli del robot.
+
+Il livello è unico per tutti i logger creati con get_logger(): di default
+WARNING, così in gara lo StreamHandler non scrive su stdout dal loop di
+controllo. set_level() lo cambia a runtime (main.py --log-level, oppure
+POST /settings/log dalla dashboard).
 """
 
 import logging
 import sys
 
+# Livelli accettati da set_level() per nome
+LEVELS = {
+    "DEBUG":   logging.DEBUG,
+    "INFO":    logging.INFO,
+    "WARNING": logging.WARNING,
+    "ERROR":   logging.ERROR,
+}
+
+_level   = logging.WARNING
+_loggers = []
+
 
-def get_logger(name: str, level: int = logging.INFO) -> logging.Logger:
+def get_logger(name: str, level: int = None) -> logging.Logger:
     logger = logging.getLogger(name)
     if not logger.handlers:
         handler = logging.StreamHandler(sys.stdout)
@@ -17,5 +33,24 @@ def get_logger(name: str, level: int = logging.INFO) -> logging.Logger:
             datefmt="%H:%M:%S"
         ))
         logger.addHandler(handler)
-        logger.setLevel(level)
+        logger.setLevel(_level if level is None else level)
+        _loggers.append(logger)
     return logger
+
+
+def set_level(level: int | str):
+    """Imposta il livello di tutti i logger del robot (int o nome, es. "INFO")."""
+    global _level
+    if isinstance(level, str):
+        try:
+            level = LEVELS[level.upper()]
+        except KeyError:
+            raise ValueError(f"Livello di log non valido: {level}") from None
+    _level = level
+    for logger in _loggers:
+        logger.setLevel(level)
+
+
+def get_level() -> str:
+    """Nome del livello corrente (es. "WARNING")."""
+    return logging.getLevelName(_level)
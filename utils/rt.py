@@ -0,0 +1,57 @@
+"""
+utils/rt.py
+-----------
+Helper per lo scheduling real-time dei thread di controllo.
+
+set_fifo()  → porta il thread chiamante in SCHED_FIFO: al risveglio passa
+              davanti a tutti i thread SCHED_OTHER (web server, logging...),
+              riducendo la latenza di risveglio del loop PID.
+set_idle()  → porta il thread chiamante in SCHED_IDLE: lavoro di servizio
+              (es. encode JPEG di debug) che non deve mai rubare CPU.
+pin_cpus()  → confina il thread chiamante su un insieme di core.
+
+Tutte agiscono solo sul thread che le chiama (pid 0 = thread corrente
+su Linux) e non sono fatali: se mancano i permessi il thread continua
+con lo scheduling normale.
+
+Per usare SCHED_FIFO senza root basta un limite rtprio per l'utente, es.
+in /etc/security/limits.d/99-robocup.conf:
+    pi - rtprio 50
+"""
+
+import os
+from utils.logger import get_logger
+
+log = get_logger("RT")
+
+
+def set_fifo(prio: int = 20) -> bool:
+    """Imposta SCHED_FIFO con priorità prio sul thread chiamante. True se riuscito."""
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(prio))
+        return True
+    except PermissionError:
+        log.warning("SCHED_FIFO non consentito: serve CAP_SYS_NICE o un limite rtprio")
+    except (AttributeError, OSError) as e:
+        log.warning(f"SCHED_FIFO non disponibile: {e}")
+    return False
+
+
+def pin_cpus(cpus: set[int]) -> bool:
+    """Confina il thread chiamante sui core indicati. True se riuscito."""
+    try:
+        os.sched_setaffinity(0, cpus)
+        return True
+    except (AttributeError, OSError) as e:
+        log.warning(f"Affinità CPU {sorted(cpus)} non impostata: {e}")
+    return False
+
+
+def set_idle() -> bool:
+    """Imposta SCHED_IDLE sul thread chiamante (gira solo su CPU libera). True se riuscito."""
+    try:
+        os.sched_setscheduler(0, os.SCHED_IDLE, os.sched_param(0))
+        return True
+    except (AttributeError, OSError) as e:
+        log.debug(f"SCHED_IDLE non disponibile: {e}")
+    return False
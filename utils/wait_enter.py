@@ -0,0 +1,83 @@
+"""
+utils/wait_enter.py
+-------------------
+Sostituto non bloccante di input() per gli script interattivi di test.
+
+input() blocca il thread principale finché l'utente non preme INVIO:
+nel frattempo nessuno chiama Engines.tick() e le scadenze dei movimenti
+slittano. wait_enter() attende stdin con un selector a timeout breve
+(50 ms) e tra un'attesa e l'altra chiama l'hook di servizio registrato
+con set_pump() (es. eng.tick).
+
+stdin viene letto direttamente dal file descriptor con os.read() e un
+buffer di righe proprio: con il readline() bufferizzato di sys.stdin le
+righe incollate insieme resterebbero nel buffer di Python e il select
+successivo non scatterebbe più. Se stdin non è un terminale (es. risposte
+redirette da file, che epoll non può registrare) si usa input().
+"""
+
+import os
+import selectors
+import sys
+import time
+
+# Intervallo massimo tra due chiamate all'hook di servizio
+_POLL_S = 0.05
+
+
+def _noop():
+    pass
+
+
+_pump = _noop
+
+# Byte letti da stdin non ancora restituiti (righe incollate insieme)
+_buf = b""
+
+
+def set_pump(fn=None):
+    """Registra l'hook chiamato durante l'attesa (None → nessuna azione)."""
+    global _pump
+    _pump = fn or _noop
+
+
+def wait_enter(prompt: str = "", settle: float = 0.0) -> str:
+    """
+    Stampa prompt e attende una riga da stdin senza bloccare l'hook di servizio.
+    Restituisce la riga letta senza newline finale, come input().
+
+    settle: tempo minimo (s) prima di restituire, es. l'assestamento del
+            motore dopo uno stop. Corre in parallelo all'attesa dell'utente
+            invece di precederla: si aspetta solo il residuo.
+    """
+    deadline = time.monotonic() + settle
+    line = _read_line(prompt)
+    while (remaining := deadline - time.monotonic()) > 0:
+        _pump()
+        time.sleep(min(remaining, _POLL_S))
+    return line
+
+
+def _read_line(prompt: str) -> str:
+    """Una riga da stdin, chiamando l'hook di servizio finché non arriva."""
+    global _buf
+    if not sys.stdin.isatty():
+        return input(prompt)
+
+    fd = sys.stdin.fileno()
+    print(prompt, end="", flush=True)
+    with selectors.DefaultSelector() as sel:
+        try:
+            sel.register(fd, selectors.EVENT_READ)
+        except (OSError, ValueError):
+            return input()
+        while b"\n" not in _buf:
+            if not sel.select(timeout=_POLL_S):
+                _pump()
+                continue
+            chunk = os.read(fd, 4096)
+            if not chunk:
+                raise EOFError
+            _buf += chunk
+    line, _, _buf = _buf.partition(b"\n")
+    return line.decode(sys.stdin.encoding or "utf-8", errors="replace")
@@ -0,0 +1,380 @@
+"""
+web/backend.py
+--------------
+Accesso del web server al RobotController, nello stesso processo o da un
+processo separato.
+
+LocalBackend  → chiama direttamente il controller (web server in thread).
+RemoteBackend → stessa interfaccia, usata dal processo del web server: le
+                chiamate viaggiano su una multiprocessing.Pipe fino al
+                Bridge nel processo del robot, i JPEG di debug passano da
+                un buffer in memoria condivisa (FrameSlot).
+
+Con il web server in un processo separato il parsing HTTP, la
+serializzazione JSON e lo streaming MJPEG non contendono il GIL a visione
+e PID: nel processo del robot restano solo due thread di servizio che
+eseguono chiamate brevi e copiano i JPEG nel buffer condiviso.
+"""
+
+import threading
+from utils.cfg_writer import save_settings
+from utils.logger import get_logger, set_level
+from utils.rt import pin_cpus
+
+log = get_logger("WebBackend")
+
+# Operazioni inoltrate da RemoteBackend al backend locale tramite il Bridge
+# (add/remove_debug_client sono gestite dal Bridge stesso)
+_CALLS = frozenset((
+    "status", "settings",
+    "update_pid", "update_vision", "update_speeds", "set_servo",
+    "save", "start", "stop", "set_log_level",
+))
+
+
+# ── Backend locale ─────────────────────────────────────────────────────────────
+
+class LocalBackend:
+    """
+    Operazioni del web server eseguite direttamente sul RobotController.
+
+    status() e settings() ricevono la versione già nota al chiamante e
+    restituiscono (versione, dati): dati è None se la versione non è
+    cambiata, così il server riusa il JSON in cache.
+    """
+
+    def __init__(self, controller, config_file: str):
+        self._controller  = controller
+        self._config_file = config_file
+        # Valori da salvare su file, ricostruiti solo quando cambia la
+        # versione dei settings: (versione, dict con chiavi già minuscole)
+        self._save_cache  = (-1, None)
+
+    def status(self, known_ver: int) -> tuple[int, dict | None]:
+        state = self._controller.state
+        ver = state.version
+        return ver, (state.snapshot() if ver != known_ver else None)
+
+    def settings(self, known_ver: int) -> tuple[int, dict | None]:
+        ver = self._controller.settings_version
+        return ver, (self._settings_dict() if ver != known_ver else None)
+
+    def update_pid(self, **kwargs):
+        self._controller.update_pid(**kwargs)
+
+    def update_vision(self, **kwargs):
+        self._controller.update_vision(**kwargs)
+
+    def update_speeds(self, **kwargs):
+        self._controller.update_speeds(**kwargs)
+
+    def set_servo(self, angle: float):
+        # Nessun settle_time: movimento live dallo slider
+        self._controller.engines.set_servo(angle, settle_time=0)
+        self._controller.invalidate_settings()
+
+    def save(self):
+        """Salva tutti i settings correnti su file."""
+        ver = self._controller.settings_version
+        cached_ver, updates = self._save_cache
+        if cached_ver != ver:
+            updates = self._save_dict()
+            self._save_cache = (ver, updates)
+        save_settings(self._config_file, updates, normalized=True)
+
+    def set_log_level(self, level: str):
+        set_level(level)
+
+    def start(self):
+        self._controller.start()
+
+    def stop(self):
+        self._controller.stop()
+
+    def add_debug_client(self) -> threading.Event:
+        return self._controller.detector.add_debug_client()
+
+    def remove_debug_client(self, event: threading.Event):
+        self._controller.detector.remove_debug_client(event)
+
+    def wait_debug_frame(self, last_seq: int, timeout: float,
+                         event: threading.Event) -> tuple[int, bytes | None]:
+        return self._controller.detector.wait_debug_frame(last_seq, timeout, event)
+
+    def _save_dict(self) -> dict:
+        """Valori live nel formato di settings.cfg (sezioni e chiavi minuscole)."""
+        eng = self._controller.engines
+        pid = self._controller.pid
+        vc  = self._controller.detector.vision
+        return {
+            "pid": {
+                "kp":           pid.kp,
+                "ki":           pid.ki,
+                "kd":           pid.kd,
+                "dead_zone":    pid.dead_zone,
+                "max_integral": pid.max_integral,
+            },
+            "speeds": {
+                "base_speed":  eng.base_speed,
+                "max_speed":   eng.max_speed,
+                "min_speed":   eng.min_speed,
+                "turn_speed":  eng.turn_speed,
+            },
+            "vision": {
+                "threshold_value":  vc.threshold,
+                "blur_kernel":      vc.blur_k,
+                "roi_top_ratio":    vc.roi_top,
+                "roi_bottom_ratio": vc.roi_bottom,
+                "side_margin_ratio":vc.side_margin,
+                "continuity_weight_power": vc.continuity_power,
+            },
+            "camera": {
+                "servo_camera_angle": eng.servo_angle,
+            },
+        }
+
+    def _settings_dict(self) -> dict:
+        """Tutti i parametri live correnti, come restituiti da GET /settings."""
+        eng = self._controller.engines
+        pid = self._controller.pid
+        vc  = self._controller.detector.vision
+        return {
+            "pid": {
+                "kp":           pid.kp,
+                "ki":           pid.ki,
+                "kd":           pid.kd,
+                "dead_zone":    pid.dead_zone,
+                "max_integral": pid.max_integral,
+            },
+            "speeds": {
+                "base_speed":  eng.base_speed,
+                "max_speed":   eng.max_speed,
+                "min_speed":   eng.min_speed,
+                "turn_speed":  eng.turn_speed,
+            },
+            "vision": {
+                "threshold":        vc.threshold,
+                "blur_k":           vc.blur_k,
+                "roi_top":          vc.roi_top,
+                "roi_bottom":       vc.roi_bottom,
+                "side_margin":      vc.side_margin,
+                "continuity_power": vc.continuity_power,
+            },
+            "camera": {
+                "servo_camera_angle": eng.servo_angle,
+            },
+        }
+
+
+# ── Memoria condivisa per i JPEG ───────────────────────────────────────────────
+
+class FrameSlot:
+    """
+    Ultimo JPEG di debug in memoria condivisa tra i due processi.
+
+    Buffer a dimensione fissa più lunghezza e numero di sequenza, protetti
+    da una Condition condivisa: write() la notifica e gli stream del
+    processo web si risvegliano al nuovo frame invece di fare polling.
+    Va creato prima di avviare il processo web e passato come argomento
+    del Process.
+    """
+
+    SIZE = 256 * 1024
+
+    def __init__(self, ctx):
+        self._buf  = ctx.RawArray("B", self.SIZE)
+        self._len  = ctx.RawValue("I", 0)
+        self._seq  = ctx.RawValue("Q", 0)
+        self._cond = ctx.Condition()
+
+    def write(self, jpeg: bytes) -> bool:
+        """Pubblica un JPEG. False se non entra nel buffer (frame scartato)."""
+        n = len(jpeg)
+        if n > self.SIZE:
+            return False
+        with self._cond:
+            memoryview(self._buf).cast("B")[:n] = jpeg
+            self._len.value = n
+            self._seq.value += 1
+            self._cond.notify_all()
+        return True
+
+    def wait(self, last_seq: int, timeout: float) -> bool:
+        """Attende un JPEG più recente di last_seq. False se scade il timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._seq.value != last_seq, timeout)
+
+    def read(self, last_seq: int) -> tuple[int, bytes | None]:
+        """(seq, frame) se c'è un JPEG più recente di last_seq, altrimenti (seq, None)."""
+        with self._cond:
+            seq = self._seq.value
+            if seq == last_seq or seq == 0:
+                return seq, None
+            return seq, bytes(memoryview(self._buf).cast("B")[:self._len.value])
+
+
+# ── Backend remoto (processo web) ──────────────────────────────────────────────
+
+class RemoteBackend:
+    """
+    Stessa interfaccia di LocalBackend, dal processo del web server.
+    Le chiamate sono serializzate da un lock: la Pipe è condivisa da tutti
+    i worker HTTP.
+
+    L'ultimo JPEG letto dal FrameSlot resta in cache con la sua sequenza:
+    con più client collegati il frame viene copiato dalla memoria condivisa
+    una volta sola e tutti gli stream inviano lo stesso oggetto bytes.
+    """
+
+    def __init__(self, conn, frames: FrameSlot):
+        self._conn   = conn
+        self._lock   = threading.Lock()
+        self._frames = frames
+
+        self._frame      = (0, None)   # (seq, bytes) ultimo JPEG copiato
+        self._frame_lock = threading.Lock()
+
+    def _call(self, op: str, *args, **kwargs):
+        with self._lock:
+            self._conn.send((op, args, kwargs))
+            ok, result = self._conn.recv()
+        if not ok:
+            raise RuntimeError(result)
+        return result
+
+    def status(self, known_ver: int) -> tuple[int, dict | None]:
+        return self._call("status", known_ver)
+
+    def settings(self, known_ver: int) -> tuple[int, dict | None]:
+        return self._call("settings", known_ver)
+
+    def update_pid(self, **kwargs):
+        self._call("update_pid", **kwargs)
+
+    def update_vision(self, **kwargs):
+        self._call("update_vision", **kwargs)
+
+    def update_speeds(self, **kwargs):
+        self._call("update_speeds", **kwargs)
+
+    def set_servo(self, angle: float):
+        self._call("set_servo", angle)
+
+    def save(self):
+        self._call("save")
+
+    def set_log_level(self, level: str):
+        self._call("set_log_level", level)
+
+    def start(self):
+        self._call("start")
+
+    def stop(self):
+        self._call("stop")
+
+    def add_debug_client(self) -> None:
+        # Nessun Event per client: wait_debug_frame() attende sul FrameSlot
+        self._call("add_debug_client")
+
+    def remove_debug_client(self, event=None):
+        self._call("remove_debug_client")
+
+    def wait_debug_frame(self, last_seq: int, timeout: float,
+                         event=None) -> tuple[int, bytes | None]:
+        """Attende sul FrameSlot un frame nuovo o il timeout."""
+        seq, frame = self._latest_frame()
+        if seq == last_seq:
+            self._frames.wait(last_seq, timeout)
+            seq, frame = self._latest_frame()
+        return seq, (frame if seq != last_seq else None)
+
+    def _latest_frame(self) -> tuple[int, bytes | None]:
+        """Ultimo JPEG: copia dal FrameSlot solo se è più recente della cache."""
+        with self._frame_lock:
+            seq, frame = self._frames.read(self._frame[0])
+            if frame is not None:
+                self._frame = (seq, frame)
+            return self._frame
+
+
+# ── Lato processo robot ────────────────────────────────────────────────────────
+
+class Bridge:
+    """
+    Lato processo robot del web server separato.
+
+    serve() esegue sul backend locale le chiamate in arrivo dal processo
+    web; pump() copia ogni nuovo JPEG di debug nel FrameSlot. Tutti gli
+    stream del processo web contano come un solo client del detector,
+    registrato da pump() finché ce n'è almeno uno.
+    """
+
+    def __init__(self, backend: LocalBackend, frames: FrameSlot, cpu: int):
+        self._backend    = backend
+        self._frames     = frames
+        self._cpu        = cpu
+        self._clients    = 0
+        self._clients_cv = threading.Condition()
+
+    def _add_clients(self, n: int):
+        with self._clients_cv:
+            self._clients = max(0, self._clients + n)
+            self._clients_cv.notify_all()
+
+    def serve(self, conn):
+        """
+        Risponde alle chiamate del processo web finché la Pipe resta aperta.
+        Alla chiusura gli stream rimasti vengono azzerati, così l'encode
+        JPEG non resta attivo.
+        """
+        pin_cpus({self._cpu})
+        while True:
+            try:
+                op, args, kwargs = conn.recv()
+            except (EOFError, OSError):
+                break
+
+            if op == "add_debug_client":
+                self._add_clients(1)
+                conn.send((True, None))
+                continue
+            if op == "remove_debug_client":
+                self._add_clients(-1)
+                conn.send((True, None))
+                continue
+            if op not in _CALLS:
+                conn.send((False, f"Operazione sconosciuta: {op}"))
+                continue
+            try:
+                result = getattr(self._backend, op)(*args, **kwargs)
+            except Exception as e:
+                conn.send((False, str(e)))
+                continue
+            conn.send((True, result))
+
+        with self._clients_cv:
+            self._clients = 0
+            self._clients_cv.notify_all()
+        log.warning("Processo web disconnesso")
+
+    def pump(self):
+        """Copia ogni nuovo JPEG di debug nel FrameSlot condiviso col processo web."""
+        pin_cpus({self._cpu})
+        last_seq = 0
+        while True:
+            # Nessuno stream aperto: niente client nel detector, niente encode
+            with self._clients_cv:
+                self._clients_cv.wait_for(lambda: self._clients > 0)
+
+            event = self._backend.add_debug_client()
+            try:
+                while self._clients > 0:
+                    seq, frame = self._backend.wait_debug_frame(last_seq, 0.5, event)
+                    if frame is None or seq == last_seq:
+                        continue
+                    last_seq = seq
+                    if not self._frames.write(frame):
+                        log.warning("JPEG di debug troppo grande per il buffer condiviso: %d byte",
+                                    len(frame))
+            finally:
+                self._backend.remove_debug_client(event)
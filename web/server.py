@@ -7,33 +7,124 @@ Routes:
   GET  /              → dashboard HTML
   GET  /stream        → MJPEG live stream del frame elaborato
   GET  /status        → JSON con stato robot
-  GET  /settings      → JSON con tutti i settings correnti
+  GET  /settings      → JSON con tutti i settings correnti (ETag / 304)
   POST /settings/pid    → aggiorna parametri PID
   POST /settings/vision → aggiorna parametri visione
   POST /settings/speeds → aggiorna velocità motori
   POST /settings/servo_camera → muove il servo camera
   POST /settings/save   → salva tutti i settings correnti su file
+  GET/POST /settings/log → legge / imposta il livello di log
   POST /control/start → avvia il robot
   POST /control/stop  → ferma il robot
 """
 
+import json
+import multiprocessing
+import os
 import time
 import threading
-from flask import Flask, Response, jsonify, request, render_template
+from flask import Flask, Response, request, render_template
 from CFGReader import CFGReader
-from utils.logger import get_logger
-from utils.cfg_writer import save_settings
+from utils.logger import get_logger, get_level, set_level
+from web.backend import LocalBackend, RemoteBackend, FrameSlot, Bridge
+
+try:
+    import orjson
+
+    def _dumps(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+except ImportError:
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+
+try:
+    from waitress import serve as waitress_serve
+except ImportError:
+    waitress_serve = None
+
+try:
+    import fastjsonschema
+except ImportError:
+    fastjsonschema = None
 
 log = get_logger("WebServer")
 
+# Intestazione e chiusura di ogni parte dello stream multipart MJPEG.
+# Content-Length permette al browser di mostrare il frame appena ricevuto
+# invece di aspettare il boundary successivo.
+_JPEG_HEAD = b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+_JPEG_TAIL = b"\r\n"
+
+
+def _json(obj, status: int = 200) -> Response:
+    """Risposta JSON serializzata con _dumps (orjson se disponibile)."""
+    return Response(_dumps(obj), status=status, mimetype="application/json")
+
+
+# ── Validazione payload POST ───────────────────────────────────────────────────
+
+def _schema(number=(), integer=(), required=()) -> dict:
+    """Schema JSON di un oggetto con soli campi numerici noti."""
+    props = {k: {"type": "number"} for k in number}
+    props.update({k: {"type": "integer"} for k in integer})
+    return {"type": "object", "properties": props,
+            "required": list(required), "additionalProperties": False}
+
+
+def _compile(schema: dict):
+    """
+    Validatore precompilato dello schema: restituisce i dati validati o
+    solleva ValueError (JsonSchemaException ne è una sottoclasse).
+    Senza fastjsonschema usa un controllo equivalente sui soli tipi.
+    """
+    if fastjsonschema is not None:
+        return fastjsonschema.compile(schema)
+
+    types = {k: p["type"] for k, p in schema["properties"].items()}
+    required = schema["required"]
+
+    def validate(data):
+        if not isinstance(data, dict):
+            raise ValueError("Il payload deve essere un oggetto JSON")
+        for key, val in data.items():
+            t = types.get(key)
+            if t is None:
+                raise ValueError(f"Campo '{key}' non previsto")
+            if t == "string":
+                valid = isinstance(val, str)
+            elif isinstance(val, bool) or not isinstance(val, (int, float)):
+                valid = False
+            else:
+                valid = t == "number" or isinstance(val, int) or val.is_integer()
+            if not valid:
+                raise ValueError(f"Valore non valido per {key}")
+        for key in required:
+            if key not in data:
+                raise ValueError(f"Campo '{key}' mancante")
+        return data
+
+    return validate
+
+
+_validate_pid    = _compile(_schema(number=("kp", "ki", "kd", "dead_zone", "max_integral")))
+_validate_vision = _compile(_schema(number=("roi_top", "roi_bottom", "side_margin", "continuity_power"),
+                                    integer=("threshold", "blur_k")))
+_validate_speeds = _compile(_schema(number=("base_speed", "max_speed", "min_speed", "turn_speed")))
+_validate_servo  = _compile(_schema(number=("angle",), required=("angle",)))
+_validate_log    = _compile({"type": "object",
+                             "properties": {"level": {"type": "string"}},
+                             "required": ["level"], "additionalProperties": False})
+
 
 class WebServer:
     """
     Server Flask che espone la dashboard di debug.
-    Il RobotController viene passato dall'esterno (dependency injection).
+    Il RobotController viene passato dall'esterno (dependency injection);
+    le route lo raggiungono tramite un backend (web/backend.py), locale o,
+    nel processo web separato, remoto.
     """
 
-    def __init__(self, controller, config_file: str = "settings.cfg"):
+    def __init__(self, controller, config_file: str = "settings.cfg", backend=None):
         cfg = CFGReader(config_file)
         if not cfg:
             raise FileNotFoundError(f"'{config_file}' non trovato!")
@@ -42,8 +133,18 @@ class WebServer:
         self._port        = cfg.read("web", "port")
         self._debug       = cfg.read("web", "debug")
         self._stream_fps  = cfg.read("web", "stream_fps")
-        self._controller  = controller
+        self._cpu         = int(cfg.read("web", "cpu"))
+        self._process     = cfg.read("web", "process")
         self._config_file = config_file
+        self._backend     = backend or LocalBackend(controller, config_file)
+
+        # JSON già serializzati: (bytes, versione da cui sono stati generati).
+        # Si rigenerano solo quando la versione di stato/settings cambia.
+        self._status_cache   = (None, -1)
+        self._settings_cache = (None, -1)
+        # Il contatore di versione riparte da zero a ogni avvio: il prefisso
+        # evita che un ETag di un'esecuzione precedente risulti ancora valido
+        self._etag_prefix = f"{os.getpid():x}-{int(time.time()):x}-"
 
         self._app = Flask(__name__, template_folder="templates")
         self._register_routes()
@@ -68,158 +169,113 @@ class WebServer:
         # ── Stato robot ────────────────────────────────────────────────────
         @app.route("/status")
         def status():
-            return jsonify(self._controller.state.snapshot())
+            body, cached_ver = self._status_cache
+            ver, data = self._backend.status(cached_ver)
+            if data is not None:
+                body = _dumps(data)
+                self._status_cache = (body, ver)
+            return Response(body, mimetype="application/json")
 
         # ── Settings GET ───────────────────────────────────────────────────
         @app.route("/settings")
         def settings():
-            eng = self._controller.engines
-            pid = self._controller.pid
-            det = self._controller.detector
-            return jsonify({
-                "pid": {
-                    "kp":           pid.kp,
-                    "ki":           pid.ki,
-                    "kd":           pid.kd,
-                    "dead_zone":    pid.dead_zone,
-                    "max_integral": pid.max_integral,
-                },
-                "speeds": {
-                    "base_speed":  eng.base_speed,
-                    "max_speed":   eng.max_speed,
-                    "min_speed":   eng.min_speed,
-                    "turn_speed":  eng.turn_speed,
-                },
-                "vision": {
-                    "threshold":        det._threshold,
-                    "blur_k":           det._blur_k,
-                    "roi_top":          det._roi_top,
-                    "roi_bottom":       det._roi_bottom,
-                    "side_margin":      det._side_margin,
-                    "continuity_power": det._continuity_power,
-                },
-                "camera": {
-                    "servo_camera_angle": eng.servo_angle,
-                },
-            })
+            # ETag dalla versione dei settings: se il browser ha già questa
+            # versione risponde 304 senza corpo e riusa il JSON in cache
+            body, cached_ver = self._settings_cache
+            ver, data = self._backend.settings(cached_ver)
+            etag = f"{self._etag_prefix}{ver}"
+            headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+            if request.if_none_match.contains(etag):
+                return Response(status=304, headers=headers)
+
+            if data is not None:
+                body = _dumps(data)
+                self._settings_cache = (body, ver)
+            return Response(body, mimetype="application/json", headers=headers)
 
         # ── Settings POST PID ──────────────────────────────────────────────
         @app.route("/settings/pid", methods=["POST"])
         def settings_pid():
-            data = request.get_json(force=True) or {}
-            parsed = {}
-            for key in ("kp", "ki", "kd", "dead_zone", "max_integral"):
-                if key in data:
-                    try:
-                        parsed[key] = float(data[key])
-                    except (ValueError, TypeError):
-                        return jsonify({"error": f"Valore non valido per {key}"}), 400
-            self._controller.update_pid(**parsed)
-            log.info(f"PID aggiornato via web: {parsed}")
-            return jsonify({"ok": True, "updated": parsed})
+            try:
+                parsed = _validate_pid(request.get_json(force=True) or {})
+            except ValueError as e:
+                return _json({"error": str(e)}, 400)
+            self._backend.update_pid(**parsed)
+            log.info("PID aggiornato via web: %s", parsed)
+            return _json({"ok": True, "updated": parsed})
 
         # ── Settings POST Vision ───────────────────────────────────────────
         @app.route("/settings/vision", methods=["POST"])
         def settings_vision():
-            data = request.get_json(force=True) or {}
-            parsed = {}
-            float_keys = ("roi_top", "roi_bottom", "side_margin", "continuity_power")
-            int_keys   = ("threshold", "blur_k")
-            for key in float_keys:
-                if key in data:
-                    try:
-                        parsed[key] = float(data[key])
-                    except (ValueError, TypeError):
-                        return jsonify({"error": f"Valore non valido per {key}"}), 400
-            for key in int_keys:
-                if key in data:
-                    try:
-                        parsed[key] = int(data[key])
-                    except (ValueError, TypeError):
-                        return jsonify({"error": f"Valore non valido per {key}"}), 400
-            self._controller.update_vision(**parsed)
-            log.info(f"Vision aggiornato via web: {parsed}")
-            return jsonify({"ok": True, "updated": parsed})
+            try:
+                parsed = _validate_vision(request.get_json(force=True) or {})
+            except ValueError as e:
+                return _json({"error": str(e)}, 400)
+            # "integer" accetta anche 5.0: blur_k finisce nel ksize di OpenCV
+            for key in ("threshold", "blur_k"):
+                if key in parsed:
+                    parsed[key] = int(parsed[key])
+            self._backend.update_vision(**parsed)
+            log.info("Vision aggiornato via web: %s", parsed)
+            return _json({"ok": True, "updated": parsed})
 
         # ── Settings POST Speeds ───────────────────────────────────────────
         @app.route("/settings/speeds", methods=["POST"])
         def settings_speeds():
-            data = request.get_json(force=True) or {}
-            parsed = {}
-            for key in ("base_speed", "max_speed", "min_speed", "turn_speed"):
-                if key in data:
-                    try:
-                        parsed[key] = float(data[key])
-                    except (ValueError, TypeError):
-                        return jsonify({"error": f"Valore non valido per {key}"}), 400
-            self._controller.update_speeds(**parsed)
-            log.info(f"Speeds aggiornato via web: {parsed}")
-            return jsonify({"ok": True, "updated": parsed})
+            try:
+                parsed = _validate_speeds(request.get_json(force=True) or {})
+            except ValueError as e:
+                return _json({"error": str(e)}, 400)
+            self._backend.update_speeds(**parsed)
+            log.info("Speeds aggiornato via web: %s", parsed)
+            return _json({"ok": True, "updated": parsed})
 
         # ── Servo camera ───────────────────────────────────────────────────
         @app.route("/settings/servo_camera", methods=["POST"])
         def settings_servo_camera():
-            data = request.get_json(force=True) or {}
-            if "angle" not in data:
-                return jsonify({"error": "Campo 'angle' mancante"}), 400
             try:
-                angle = float(data["angle"])
-            except (ValueError, TypeError):
-                return jsonify({"error": "Valore angle non valido"}), 400
-            # Muovi il servo senza settle_time (movimento live dallo slider)
-            self._controller.engines.set_servo(angle, settle_time=0)
-            log.info(f"Servo camera → {angle}°")
-            return jsonify({"ok": True, "angle": angle})
+                angle = _validate_servo(request.get_json(force=True) or {})["angle"]
+            except ValueError as e:
+                return _json({"error": str(e)}, 400)
+            self._backend.set_servo(angle)
+            log.info("Servo camera → %s°", angle)
+            return _json({"ok": True, "angle": angle})
 
         # ── Salva settings su file ─────────────────────────────────────────
         @app.route("/settings/save", methods=["POST"])
         def settings_save():
-            eng = self._controller.engines
-            pid = self._controller.pid
-            det = self._controller.detector
             try:
-                save_settings(self._config_file, {
-                    "pid": {
-                        "kp":           pid.kp,
-                        "ki":           pid.ki,
-                        "kd":           pid.kd,
-                        "dead_zone":    pid.dead_zone,
-                        "max_integral": pid.max_integral,
-                    },
-                    "speeds": {
-                        "base_speed":  eng.base_speed,
-                        "max_speed":   eng.max_speed,
-                        "min_speed":   eng.min_speed,
-                        "turn_speed":  eng.turn_speed,
-                    },
-                    "vision": {
-                        "threshold_value":  det._threshold,
-                        "blur_kernel":      det._blur_k,
-                        "roi_top_ratio":    det._roi_top,
-                        "roi_bottom_ratio": det._roi_bottom,
-                        "side_margin_ratio":det._side_margin,
-                        "continuity_weight_power": det._continuity_power,
-                    },
-                    "camera": {
-                        "servo_camera_angle": eng.servo_angle,
-                    },
-                })
+                self._backend.save()
                 log.info("Settings salvati su file")
-                return jsonify({"ok": True})
+                return _json({"ok": True})
             except Exception as e:
-                log.error(f"Errore salvataggio settings: {e}")
-                return jsonify({"error": str(e)}), 500
+                log.error("Errore salvataggio settings: %s", e)
+                return _json({"error": str(e)}, 500)
+
+        # ── Livello di log ─────────────────────────────────────────────────
+        @app.route("/settings/log", methods=["GET", "POST"])
+        def settings_log():
+            if request.method == "GET":
+                return _json({"level": get_level()})
+            try:
+                level = _validate_log(request.get_json(force=True) or {})["level"]
+                # Processo web e, se separato, processo del robot
+                set_level(level)
+                self._backend.set_log_level(level)
+            except ValueError as e:
+                return _json({"error": str(e)}, 400)
+            return _json({"ok": True, "level": get_level()})
 
         # ── Controllo robot ────────────────────────────────────────────────
         @app.route("/control/start", methods=["POST"])
         def control_start():
-            self._controller.start()
-            return jsonify({"ok": True, "mode": "following"})
+            self._backend.start()
+            return _json({"ok": True, "mode": "following"})
 
         @app.route("/control/stop", methods=["POST"])
         def control_stop():
-            self._controller.stop()
-            return jsonify({"ok": True, "mode": "stopped"})
+            self._backend.stop()
+            return _json({"ok": True, "mode": "stopped"})
 
     # ── MJPEG generator ────────────────────────────────────────────────────────
 
@@ -227,48 +283,112 @@ class WebServer:
         """
         Genera il flusso MJPEG dal frame di debug del LineDetector.
 
-        - Chiama request_debug_frame() ad ogni iterazione per segnalare
-          che c'è un client attivo (abilita l'encode JPEG nel detector).
-        - Invia solo frame nuovi (confronta puntatore oggetto), evitando
-          di ritrasmettere lo stesso JPEG più volte.
-        - Usa un intervallo minimo per non saturare la rete.
+        - Registra il client nel detector per tutta la durata dello stream
+          (abilita l'encode JPEG); la rimozione avviene nel finally, anche
+          quando il client si disconnette e il server chiude il generatore.
+        - Attende l'Event del proprio client (wait_debug_frame) invece di
+          fare polling: il frame parte appena è pronto, e solo se nuovo
+          (numero di sequenza diverso dall'ultimo inviato).
+        - Usa un intervallo minimo per non saturare la rete; lo stesso
+          intervallo fa da timeout se il detector non produce frame.
         """
-        interval   = 1.0 / self._stream_fps
-        det        = self._controller.detector
-        last_frame = None
+        interval  = 1.0 / self._stream_fps
+        backend   = self._backend
+        last_seq  = 0
+        next_send = 0.0
 
-        while True:
-            det.request_debug_frame()   # abilita encode JPEG nel detector
-            frame = det.get_debug_frame()
+        event = backend.add_debug_client()   # abilita encode JPEG nel detector
+        try:
+            while True:
+                # Limite stream_fps: non inviare prima di next_send
+                delay = next_send - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
 
-            if frame is not None and frame is not last_frame:
-                last_frame = frame
-                yield (
-                    b"--frame\r\n"
-                    b"Content-Type: image/jpeg\r\n\r\n" +
-                    frame +
-                    b"\r\n"
-                )
+                seq, frame = backend.wait_debug_frame(last_seq, interval, event)
 
-            time.sleep(interval)
+                if frame is not None and seq != last_seq:
+                    last_seq  = seq
+                    next_send = time.monotonic() + interval
+                    head = _JPEG_HEAD + b"%d\r\n\r\n" % len(frame)
+                    if waitress_serve is not None:
+                        # waitress accoda i chunk nel buffer del canale e li
+                        # invia insieme: tre chunk, nessuna copia del JPEG
+                        yield head
+                        yield frame
+                        yield _JPEG_TAIL
+                    else:
+                        # Il server di sviluppo fa write + flush per ogni
+                        # chunk: una sola parte = una sola syscall per frame
+                        yield b"".join((head, frame, _JPEG_TAIL))
+        finally:
+            backend.remove_debug_client(event)
 
     # ── Avvio server ───────────────────────────────────────────────────────────
 
     def run(self, threaded: bool = True):
         """
-        Avvia Flask.
-        threaded=True → gira in background (usato da main.py)
+        Avvia il server HTTP.
+        threaded=True → gira in background (usato da main.py): in un processo
+                        separato se web.process è attivo, altrimenti in un thread
         threaded=False → blocca (utile per debug standalone)
         """
-        kwargs = dict(host=self._host, port=self._port,
-                      debug=False, use_reloader=False)
-        if threaded:
-            t = threading.Thread(
-                target=lambda: self._app.run(**kwargs),
-                daemon=True
-            )
+        log.info("Web server su http://%s:%s", self._host, self._port)
+        if not threaded:
+            self._serve()
+        elif self._process:
+            self._start_process()
+        else:
+            t = threading.Thread(target=self._serve, daemon=True, name="WebServer")
             t.start()
-            log.info(f"Web server su http://{self._host}:{self._port}")
+
+    def _start_process(self):
+        """
+        Avvia il server HTTP in un processo figlio (spawn: nessun fork del
+        processo con camera e thread già attivi). Nel processo del robot
+        restano due thread sul core di servizio: WebBridge esegue le
+        chiamate in arrivo sulla Pipe, WebFrames copia i JPEG di debug nel
+        FrameSlot condiviso.
+        """
+        ctx = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = ctx.Pipe()
+        frames = FrameSlot(ctx)
+
+        proc = ctx.Process(target=_serve_process, args=(self._config_file, child_conn, frames, get_level()),
+                           daemon=True, name="WebServer")
+        proc.start()
+        child_conn.close()
+
+        bridge = Bridge(self._backend, frames, self._cpu)
+        threading.Thread(target=bridge.serve, args=(parent_conn,),
+                         daemon=True, name="WebBridge").start()
+        threading.Thread(target=bridge.pump, daemon=True, name="WebFrames").start()
+        log.info("Web server nel processo %d", proc.pid)
+
+    def _serve(self):
+        """
+        Corpo del thread HTTP: si confina sul core di servizio (web.cpu) e
+        avvia waitress, o il server di sviluppo Flask se waitress manca.
+        L'affinità è ereditata dai thread worker creati da waitress, così
+        visione e PID restano soli sugli altri core.
+        """
+        try:
+            os.sched_setaffinity(0, {self._cpu})
+        except (AttributeError, OSError) as e:
+            log.warning("Affinità CPU %s non impostata: %s", self._cpu, e)
+
+        if waitress_serve is not None:
+            # Ogni client MJPEG occupa un worker per tutta la durata dello
+            # stream: 4 thread lasciano spazio anche a /status e /settings
+            waitress_serve(self._app, host=self._host, port=self._port,
+                           threads=4, _quiet=True)
         else:
-            log.info(f"Web server su http://{self._host}:{self._port}")
-            self._app.run(**kwargs)
+            log.warning("waitress non installato — uso il server di sviluppo Flask")
+            self._app.run(host=self._host, port=self._port,
+                          debug=False, use_reloader=False, threaded=True)
+
+
+def _serve_process(config_file: str, conn, frames: FrameSlot, log_level: str):
+    """Entry point del processo web: stesso server, backend remoto."""
+    set_level(log_level)
+    WebServer(None, config_file, backend=RemoteBackend(conn, frames))._serve()